@@ -6,15 +6,26 @@ from app.config.settings import settings
 # Configure Clerk (adjust verify_aud/verify_iss as needed)
 clerk_config = ClerkConfig(
     jwks_url=settings.CLERK_JWKS_ENDPOINT,
+    public_key=settings.CLERK_JWT_PUBLIC_KEY,  # Verify offline when set
+    jwks_fallback=settings.CLERK_JWKS_FALLBACK,
     audience=settings.CLERK_JWT_AUDIENCE,
     issuer=settings.CLERK_JWT_ISSUER,
     verify_aud=False,  # Set to True if using custom audience
     verify_iss=False,  # Set to True if verifying issuer
-    jwks_cache_keys=True  # Better performance
 )
 
 clerk_auth = ClerkHTTPBearer(config=clerk_config)
 
+async def init_clerk_auth():
+    """Pre-fetch the JWKS and start its background refresh"""
+    if clerk_auth.offline:
+        # The PEM is enough, the JWKS is only fetched lazily if the key rotates
+        return
+    await clerk_auth.jwks_store.start()
+
+async def close_clerk_auth():
+    await clerk_auth.jwks_store.stop()
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(clerk_auth)
 ) -> dict:
@@ -0,0 +1,26 @@
+from fastapi import Request
+
+from app.config.settings import settings
+from app.db.query_stats import start_query_stats, end_query_stats
+from app.utils.monitoring import DB_QUERIES_PER_REQUEST, DB_TIME_PER_REQUEST
+
+async def query_stats_middleware(request: Request, call_next):
+    """Record how many SQL statements a request ran and how long they took"""
+    # Nested under an active collector (e.g. assert_max_queries), which still sees these queries
+    stats = start_query_stats()
+    try:
+        response = await call_next(request)
+    finally:
+        end_query_stats(stats)
+
+    # The router stores the matched route in the scope; fall back to the raw path for 404s
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", request.url.path)
+    DB_QUERIES_PER_REQUEST.labels(method=request.method, route=route_path).observe(stats.count)
+    DB_TIME_PER_REQUEST.labels(method=request.method, route=route_path).observe(stats.duration)
+
+    if settings.ENVIRONMENT != "production":
+        response.headers.append(
+            "Server-Timing", f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        )
+    return response
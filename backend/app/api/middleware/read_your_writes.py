@@ -0,0 +1,26 @@
+from fastapi import Request
+import time
+
+from app.config.settings import settings
+from app.db.session import PRIMARY_COOKIE, track_writes
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """
+    Pin a client's reads to the primary for a few seconds after it wrote, so
+    it never reads its own change back from a lagging replica.
+    """
+    if settings.DATABASE_REPLICA_ASYNC_URL is None:
+        return await call_next(request)
+
+    tracker = track_writes()
+    response = await call_next(request)
+    if tracker.wrote:
+        sticky = settings.DATABASE_REPLICA_STICKY_SECONDS
+        response.set_cookie(
+            PRIMARY_COOKIE,
+            str(time.time() + sticky),
+            max_age=sticky,
+            httponly=True,
+            samesite="lax",
+        )
+    return response
@@ -0,0 +1,232 @@
+# app/api/v1/billing/handlers.py
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+
+from app.models.billing import SubscriptionStatus
+from app.crud.billing import (
+    is_stale_subscription_event,
+    get_subscription_plan_by_id,
+    get_subscription_plan_id_from_stripe_price_id,
+    upsert_customer_subscription,
+    enqueue_clerk_metadata,
+    get_user_id_by_stripe_customer_id,
+    get_user_id_by_stripe_subscription_id,
+    upsert_stripe_customer
+)
+from app.workers.clerk_sync import clerk_sync_worker
+from app.utils.redis import invalidate_tags
+
+logger = logging.getLogger(__name__)
+
+# Handlers raise on failure so the webhook worker pool can retry the event
+
+class StaleEventError(Exception):
+    """The event is older than the last one applied to its subscription"""
+
+def webhook_partition_key(payload: dict) -> str:
+    """Events sharing a key are processed in order, one at a time"""
+    obj = payload.get("data", {}).get("object", {})
+    if obj.get("object") == "subscription":
+        return obj["id"]
+    return obj.get("subscription") or obj.get("id") or payload["id"]
+
+async def reject_stale_event(db: AsyncSession, subscription, event_created: datetime):
+    if await is_stale_subscription_event(db, subscription.id, event_created):
+        raise StaleEventError(f"Event for {subscription.id} from {event_created.isoformat()} is older than the last applied one")
+
+async def handle_subscription_created(subscription: dict, db: AsyncSession, event_created: datetime):
+    """Handle successful checkout completion"""
+    await reject_stale_event(db, subscription, event_created)
+    try:
+        # Try to get user_id from subscription metadata first
+        user_id = subscription.metadata.get("clerk_user_id")
+        print(f"User ID from metadata: {user_id}")
+        # If not found in subscription, try to look up via customer ID
+        if not user_id:
+            user_id = await get_user_id_by_stripe_customer_id(db, subscription.customer)
+            if not user_id:
+                logger.error("No user_id found in subscription metadata or customer index")
+                return  # Don't raise error since Stripe will retry
+        else:
+            await upsert_stripe_customer(db, user_id, subscription.customer)
+                
+        # Rest of your handling logic...
+        plan_id = await get_subscription_plan_id_from_stripe_price_id(db, subscription.plan.id)
+        plan = await get_subscription_plan_by_id(db, plan_id)
+        print(f"Plan ID: {plan_id}, Plan: {plan}")
+        # Update database
+        subscription_data = {
+            'user_id': user_id,
+            'stripe_customer_id': subscription.customer,
+            'stripe_subscription_id': subscription.id,
+            'plan_id': plan_id,
+            'status': SubscriptionStatus(subscription.status),
+            'current_period_start': datetime.fromtimestamp(subscription.current_period_start),
+            'current_period_end': datetime.fromtimestamp(subscription.current_period_end),
+            'cancel_at_period_end': subscription.cancel_at_period_end,
+            'last_event_at': event_created
+        }
+        
+        if await upsert_customer_subscription(db, subscription_data) is None:
+            raise StaleEventError(f"A newer event was applied to {subscription.id} concurrently")
+        await invalidate_tags(f"user:{user_id}")
+        # Update Clerk metadata
+        metadata = {
+            "subscription_status": subscription.status,
+            "subscription_plan": plan.name,
+            "subscription_end": datetime.fromtimestamp(subscription.current_period_end).isoformat(),
+            "cancel_at_period_end": subscription.cancel_at_period_end
+        }
+        
+        # Delivered to Clerk by the outbox worker
+        await enqueue_clerk_metadata(db, user_id, metadata)
+        clerk_sync_worker.notify()
+
+    except Exception as e:
+        logger.error(f"Error handling subscription created: {str(e)}")
+        raise
+
+async def handle_subscription_updated(subscription: dict, db: AsyncSession, event_created: datetime):
+    """Handle subscription updates from Stripe including cancellations"""
+    await reject_stale_event(db, subscription, event_created)
+    try:
+        # First try to get the user_id from metadata (like in created handler)
+        user_id = subscription.metadata.get("clerk_user_id")
+        # If not in metadata, look up via subscription ID
+        if not user_id:
+            user_id = await get_user_id_by_stripe_subscription_id(db, subscription.id)
+            if not user_id:
+                # The created event may not have been processed yet, retry later
+                raise ValueError(f"No existing subscription found for {subscription.id}")
+
+        # Every event writes the full state: events arrive out of order and older ones are
+        # rejected, so an update may be the first (or only) event applied to the row.
+        # This also carries plan changes made in the billing portal.
+        plan_id = await get_subscription_plan_id_from_stripe_price_id(db, subscription.plan.id)
+
+        # Prepare base update data
+        subscription_data = {
+            'user_id': user_id,  # Ensure user_id is included
+            'stripe_customer_id': subscription.customer,
+            'plan_id': plan_id,
+            'status': SubscriptionStatus(subscription.status),
+            'current_period_start': datetime.fromtimestamp(subscription.current_period_start),
+            'current_period_end': datetime.fromtimestamp(subscription.current_period_end),
+            'cancel_at_period_end': subscription.cancel_at_period_end,
+            'stripe_subscription_id': subscription.id,  # Ensure we're updating the right record
+            'last_event_at': event_created
+        }
+
+        # Determine the actual cancellation scenario
+        is_cancelling = subscription.cancel_at is not None
+        is_period_end_cancellation = is_cancelling and subscription.cancel_at_period_end
+        is_custom_date_cancellation = is_cancelling and not subscription.cancel_at_period_end
+
+        if is_cancelling:
+            # All cancellations (both period-end and custom date)
+            subscription_data.update({
+                'cancel_at': datetime.fromtimestamp(subscription.cancel_at),
+                'scheduled_change_type': 'cancel',
+                'scheduled_change_date': datetime.fromtimestamp(subscription.cancel_at),
+            })
+
+            if is_period_end_cancellation:
+                subscription_data.update({
+                    'cancel_at_period_end': True,
+                })
+                logger.info(f"Period-end cancellation scheduled for {subscription.id}")
+            else:
+                subscription_data.update({
+                    'cancel_at_period_end': False,
+                })
+                logger.info(f"Custom date cancellation scheduled for {subscription.id} at {subscription.cancel_at}")
+        else:
+            # No cancellation scheduled
+            subscription_data.update({
+                'cancel_at': None,
+                'cancel_at_period_end': False,
+                'scheduled_change_type': None,
+                'scheduled_change_date': None
+            })
+            logger.info(f"Subscription {subscription.id} cancellation removed")
+
+
+        # Update database
+        db_subscription = await upsert_customer_subscription(db, subscription_data)
+        if db_subscription is None:
+            raise StaleEventError(f"A newer event was applied to {subscription.id} concurrently")
+        await invalidate_tags(f"user:{user_id}")
+        logger.info(f"Subscription {subscription.id} updated in database")
+        
+        # Update Clerk metadata
+        plan = await get_subscription_plan_by_id(db, plan_id)
+        metadata = {
+            "subscription_status": subscription.status,
+            "subscription_plan": plan.name if plan else "Unknown",
+            "subscription_end": datetime.fromtimestamp(subscription.current_period_end).isoformat(),
+            "cancel_at_period_end": subscription.cancel_at_period_end
+        }
+        
+        await enqueue_clerk_metadata(db, user_id, metadata)
+        clerk_sync_worker.notify()
+        logger.info(f"Subscription {subscription.id} updated for user {user_id}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error handling subscription update: {str(e)}")
+        raise  # Retried by the webhook worker pool
+
+async def handle_subscription_deleted(subscription: dict, db: AsyncSession, event_created: datetime):
+    """Handle subscription deletion (final cancellation) from Stripe"""
+    await reject_stale_event(db, subscription, event_created)
+    try:
+        # Get user_id from metadata or existing record
+        user_id = subscription.metadata.get("clerk_user_id")
+        if not user_id:
+            user_id = await get_user_id_by_stripe_subscription_id(db, subscription.id)
+            if not user_id:
+                raise ValueError(f"No user found for deleted subscription {subscription.id}")
+
+        # Update database - mark as fully canceled
+        subscription_data = {
+            'user_id': user_id,
+            'stripe_customer_id': subscription.customer,
+            'stripe_subscription_id': subscription.id,
+            'status': SubscriptionStatus.CANCELED,
+            'canceled_at': datetime.fromtimestamp(subscription.canceled_at) if subscription.canceled_at else None,
+            'ended_at': datetime.fromtimestamp(subscription.ended_at) if subscription.ended_at else None,
+            'cancel_at_period_end': False,
+            'cancel_at': None,
+            'scheduled_change_type': None,
+            'scheduled_change_date': None,
+            'last_event_at': event_created
+        }
+
+        if await upsert_customer_subscription(db, subscription_data) is None:
+            raise StaleEventError(f"A newer event was applied to {subscription.id} concurrently")
+        await invalidate_tags(f"user:{user_id}")
+
+        # Update Clerk metadata
+        metadata = {
+            "subscription_status": "",
+            "subscription_plan": "",
+            "subscription_end": "",
+            "cancel_at_period_end": "",
+            "cancel_at": ""
+        }
+        
+        await enqueue_clerk_metadata(db, user_id, metadata)
+        clerk_sync_worker.notify()
+        logger.info(f"Subscription {subscription.id} fully canceled for user {user_id}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error handling subscription deletion: {str(e)}", exc_info=True)
+        raise
+
+WEBHOOK_HANDLERS = {
+    "customer.subscription.created": handle_subscription_created,
+    "customer.subscription.updated": handle_subscription_updated,
+    "customer.subscription.deleted": handle_subscription_deleted,
+}
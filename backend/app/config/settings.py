@@ -19,11 +19,26 @@ class Settings(BaseSettings):
     DATABASE_MAX_OVERFLOW: int
     DATABASE_POOL_RECYCLE: int
     DATABASE_POOL_PRE_PING: bool
+    DATABASE_REPLICA_ASYNC_URL: Optional[str] = None  # Read-only GET endpoints go here when set
+    DATABASE_REPLICA_STICKY_SECONDS: int = 5  # Reads stay on the primary this long after a write
+    DATABASE_SLOW_QUERY_MS: float = 200.0  # Statements slower than this are logged
     
     # Redis
     REDIS_HOST: str
     REDIS_PORT: int
     REDIS_PASSWORD: str
+    REDIS_MAX_CONNECTIONS: int = 50  # Per worker; callers wait for a free connection past this
+    REDIS_POOL_TIMEOUT: float = 2.0  # How long to wait for a free connection
+    REDIS_SOCKET_TIMEOUT: float = 2.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # PING idle connections before reuse
+    REDIS_RETRY_ATTEMPTS: int = 3  # On connection errors and timeouts
+    REDIS_RETRY_BACKOFF_BASE: float = 0.05
+    REDIS_RETRY_BACKOFF_CAP: float = 1.0
+    CACHE_L1_MAX_SIZE: int = 2048  # In-process entries per worker, 0 disables the L1
+    CACHE_L1_MAX_TTL: float = 30.0  # Upper bound on L1 staleness if an invalidation is missed
+    CACHE_LOCK_TTL: int = 10  # Cross-process recompute lock, should exceed the slowest recomputation
+    CACHE_LOCK_WAIT: float = 5.0  # How long a miss waits for another process' recomputation
     
     # Clerk
     CLERK_API_URL: str
@@ -32,14 +47,33 @@ class Settings(BaseSettings):
     CLERK_JWT_AUDIENCE: str
     CLERK_JWT_ISSUER: str
     CLERK_PUBLISHABLE_KEY: Optional[str] = None  # For frontend
-    CLERK_JWT_PUBLIC_KEY: Optional[str] = None
+    CLERK_JWT_PUBLIC_KEY: Optional[str] = None  # When set, tokens are verified offline
+    CLERK_JWKS_FALLBACK: bool = True  # Fall back to the JWKS if CLERK_JWT_PUBLIC_KEY has rotated
     CLERK_WEBHOOK_SECRET: Optional[str] = None
+    CLERK_HTTP_MAX_CONNECTIONS: int = 20
+    CLERK_HTTP_MAX_KEEPALIVE: int = 10
+    CLERK_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    CLERK_HTTP_TIMEOUT: float = 10.0
+    CLERK_HTTP_CONNECT_TIMEOUT: float = 5.0
+    CLERK_HTTP2: bool = False  # Requires the h2 package
+    CLERK_SYNC_POLL_INTERVAL: float = 5.0
+    CLERK_SYNC_BATCH_SIZE: int = 50
+    CLERK_SYNC_LEASE_SECONDS: int = 60
+    CLERK_SYNC_MAX_BACKOFF: int = 300
     
     # Stripe
     FRONTEND_URL: str
     STRIPE_SECRET_KEY: str
     STRIPE_WEBHOOK_SECRET: str
     STRIPE_PUBLISHABLE_KEY: Optional[str] = None  # For frontend
+    STRIPE_MAX_WORKERS: int = 8  # Threads dedicated to blocking Stripe SDK calls
+    STRIPE_WEBHOOK_WORKERS: int = 4
+    STRIPE_WEBHOOK_BATCH_SIZE: int = 20
+    STRIPE_WEBHOOK_POLL_INTERVAL: float = 2.0
+    STRIPE_WEBHOOK_MAX_ATTEMPTS: int = 8
+    STRIPE_WEBHOOK_LEASE_SECONDS: int = 120
+    STRIPE_WEBHOOK_DEDUP_TTL: int = 7 * 24 * 3600  # Stripe retries deliveries for up to 3 days
+    PLAN_CATALOG_MAX_AGE: int = 300  # Reload plans even without an invalidation message
     
     # Email/SMS
     SENDGRID_API_KEY: str
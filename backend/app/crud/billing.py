@@ -1,29 +1,299 @@
-from sqlalchemy.orm import Session
-from ..models.billing import CustomerSubscription, SubscriptionPlan
+import hashlib
+import json
+import time
+from dataclasses import asdict
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, List, Optional
+from sqlalchemy import select, or_, case, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+from ..utils.plan_catalog import plan_catalog
+from ..schemas.billing import Plan, SubscriptionResponse
+from ..models.billing import SubscriptionStatus, CustomerSubscription, ClerkMetadataOutbox, StripeCustomer, StripeWebhookEvent
 
-def get_subscription_plans(db: Session):
-    return db.query(SubscriptionPlan).all()
+# Plans are served from the in-memory catalog, the session is only used to (re)load it
+async def get_subscription_plans(db: AsyncSession):
+    return list(await plan_catalog.all(db))
 
-def get_subscription_plan_by_id(db: Session, plan_id: int):
-    return db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
+async def get_plan_responses(db: AsyncSession) -> List[Plan]:
+    """Plan response models built straight from the catalog, skipping from_attributes"""
+    return [
+        Plan.model_construct(**{**asdict(plan), 'features': list(plan.features)})
+        for plan in await plan_catalog.all(db)
+    ]
 
-def get_subscription_plan_id_from_stripe_price_id(db: Session, stripe_price_id: str) -> int:
-    plan = db.query(SubscriptionPlan).filter(SubscriptionPlan.stripe_price_id == stripe_price_id).first()
-    if not plan:
+async def get_subscription_plan_by_id(db: AsyncSession, plan_id: int):
+    return await plan_catalog.get(db, plan_id)
+
+async def get_subscription_plan_id_from_stripe_price_id(db: AsyncSession, stripe_price_id: str) -> int:
+    plan = await plan_catalog.get_by_price_id(db, stripe_price_id)
+    if plan is None:
         raise ValueError(f"No subscription plan found for Stripe price ID: {stripe_price_id}")
     return plan.id
 
-def upsert_customer_subscription(db: Session, subscription_data: dict):
-    db_subscription = db.query(CustomerSubscription).filter(
-        CustomerSubscription.user_id == subscription_data['user_id']
-    ).first()
+# Rendered inline rather than bound: the planner only matches ix_customer_subscriptions_user_active
+# when it can see the predicate, which a generic plan for a parameter hides
+IS_ACTIVE_SUBSCRIPTION = CustomerSubscription.status != literal_column("'CANCELED'")
+
+# A user can hold several non-canceled rows (e.g. an incomplete_expired attempt next to
+# the live one): prefer active/trialing, then the newest
+CURRENT_SUBSCRIPTION_ORDER = (
+    case(
+        (CustomerSubscription.status.in_([SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIALING]), 0),
+        else_=1
+    ),
+    CustomerSubscription.created_at.desc(),
+)
+
+async def get_active_subscription(db: AsyncSession, user_id: str) -> Optional[CustomerSubscription]:
+    result = await db.execute(
+        select(CustomerSubscription).where(
+            CustomerSubscription.user_id == user_id,
+            IS_ACTIVE_SUBSCRIPTION
+        )
+        .order_by(*CURRENT_SUBSCRIPTION_ORDER)
+        .limit(1)
+    )
+    return result.scalars().first()
+
+# Exactly the columns SubscriptionResponse exposes
+_SUBSCRIPTION_RESPONSE_COLUMNS = [getattr(CustomerSubscription, name) for name in SubscriptionResponse.model_fields]
+
+async def get_active_subscription_response(db: AsyncSession, user_id: str) -> Optional[SubscriptionResponse]:
+    """
+    Read path for the current-subscription endpoint: selects only the response
+    columns and builds the model from the row, without hydrating an ORM entity.
+    """
+    result = await db.execute(
+        select(*_SUBSCRIPTION_RESPONSE_COLUMNS)
+        .where(CustomerSubscription.user_id == user_id, IS_ACTIVE_SUBSCRIPTION)
+        .order_by(*CURRENT_SUBSCRIPTION_ORDER)
+        .limit(1)
+    )
+    row = result.first()
+    # Validated: plan_id, status and the period columns are nullable, and a NULL must
+    # not be serialized into the cached response
+    return SubscriptionResponse.model_validate(dict(row._mapping)) if row else None
+
+async def get_latest_subscription_with_plan(db: AsyncSession, user_id: str) -> Optional[CustomerSubscription]:
+    # The plan is loaded eagerly, lazy loads aren't possible on an AsyncSession
+    result = await db.execute(
+        select(CustomerSubscription)
+        .options(joinedload(CustomerSubscription.plan))
+        .where(CustomerSubscription.user_id == user_id)
+        .order_by(CustomerSubscription.created_at.desc())
+        .limit(1)
+    )
+    return result.scalars().first()
+
+async def get_user_id_by_stripe_subscription_id(db: AsyncSession, stripe_subscription_id: str) -> Optional[str]:
+    result = await db.execute(
+        select(CustomerSubscription.user_id).where(
+            CustomerSubscription.stripe_subscription_id == stripe_subscription_id
+        )
+    )
+    return result.scalar()
+
+async def is_stale_subscription_event(db: AsyncSession, stripe_subscription_id: str, event_created: datetime) -> bool:
+    result = await db.execute(
+        select(CustomerSubscription.last_event_at).where(
+            CustomerSubscription.stripe_subscription_id == stripe_subscription_id
+        )
+    )
+    last_event_at = result.scalar()
+    return last_event_at is not None and event_created < last_event_at
+
+# Columns an upsert may write; anything else in subscription_data (cancel_at, ended_at...) is ignored
+_SUBSCRIPTION_COLUMNS = frozenset(
+    column.key for column in CustomerSubscription.__table__.columns
+    if column.key not in ('id', 'created_at', 'updated_at')
+)
+
+def _subscription_values(subscription_data: dict) -> dict:
+    return {key: value for key, value in subscription_data.items() if key in _SUBSCRIPTION_COLUMNS}
+
+def subscription_upsert_statement(rows: List[dict], returning: bool = True):
+    """
+    INSERT ... ON CONFLICT (stripe_subscription_id) DO UPDATE ... RETURNING for rows
+    sharing the same keys. Only the given columns are overwritten, and an event
+    older than the one already applied (last_event_at) leaves the row untouched,
+    in which case nothing is returned for it.
+    """
+    stmt = insert(CustomerSubscription).values(rows)
+    set_ = {
+        key: stmt.excluded[key]
+        for key in rows[0]
+        if key != 'stripe_subscription_id'
+    }
+    set_['updated_at'] = func.now()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CustomerSubscription.stripe_subscription_id],
+        set_=set_,
+        where=or_(
+            CustomerSubscription.last_event_at.is_(None),
+            stmt.excluded.last_event_at.is_(None),
+            CustomerSubscription.last_event_at <= stmt.excluded.last_event_at,
+        ),
+    )
+    return stmt.returning(CustomerSubscription) if returning else stmt
+
+async def upsert_customer_subscription(db: AsyncSession, subscription_data: dict) -> Optional[CustomerSubscription]:
+    """Insert or update one subscription in a single round trip. Returns None if the write was stale."""
+    stmt = subscription_upsert_statement([_subscription_values(subscription_data)])
+    result = await db.execute(stmt, execution_options={"populate_existing": True})
+    db_subscription = result.scalars().first()
+    await db.commit()
+    return db_subscription
+
+async def bulk_upsert_customer_subscriptions(db: AsyncSession, subscriptions: Iterable[dict]) -> List[CustomerSubscription]:
+    """
+    Upsert many subscriptions with one multi-row statement per distinct set of columns.
+    A subscription appearing twice keeps its last version, Postgres refuses to
+    update the same row twice in one statement.
+    """
+    latest = {}
+    for subscription_data in subscriptions:
+        values = _subscription_values(subscription_data)
+        latest[values['stripe_subscription_id']] = values
+
+    groups = {}
+    for values in latest.values():
+        groups.setdefault(tuple(sorted(values)), []).append(values)
+
+    written = []
+    for rows in groups.values():
+        result = await db.execute(subscription_upsert_statement(rows), execution_options={"populate_existing": True})
+        written.extend(result.scalars().all())
+    await db.commit()
+    return written
+
+# In-process LRU of user_id -> stripe_customer_id. The mapping rarely changes, but
+# upsert_stripe_customer can repoint it and other workers aren't told, so entries expire.
+_customer_ids: "OrderedDict[str, tuple]" = OrderedDict()
+_CUSTOMER_ID_CACHE_SIZE = 10_000
+_CUSTOMER_ID_CACHE_TTL = 300
+
+def _remember_customer_id(user_id: str, customer_id: str) -> None:
+    _customer_ids[user_id] = (customer_id, time.monotonic() + _CUSTOMER_ID_CACHE_TTL)
+    _customer_ids.move_to_end(user_id)
+    while len(_customer_ids) > _CUSTOMER_ID_CACHE_SIZE:
+        _customer_ids.popitem(last=False)
+
+def _recall_customer_id(user_id: str) -> Optional[str]:
+    entry = _customer_ids.get(user_id)
+    if entry is None:
+        return None
+    customer_id, expires_at = entry
+    if expires_at <= time.monotonic():
+        del _customer_ids[user_id]
+        return None
+    return customer_id
+
+async def get_stripe_customer_id(db: AsyncSession, user_id: str) -> Optional[str]:
+    customer_id = _recall_customer_id(user_id)
+    if customer_id:
+        return customer_id
+
+    result = await db.execute(
+        select(StripeCustomer.stripe_customer_id).where(StripeCustomer.user_id == user_id)
+    )
+    customer_id = result.scalar()
+    if not customer_id:
+        # Customers created before the index existed are backfilled from their subscriptions
+        result = await db.execute(
+            select(CustomerSubscription.stripe_customer_id)
+            .where(CustomerSubscription.user_id == user_id)
+            .order_by(CustomerSubscription.created_at.desc())
+            .limit(1)
+        )
+        customer_id = result.scalar()
+        if customer_id:
+            await upsert_stripe_customer(db, user_id, customer_id)
+
+    if customer_id:
+        _remember_customer_id(user_id, customer_id)
+    return customer_id
+
+async def get_user_id_by_stripe_customer_id(db: AsyncSession, customer_id: str) -> Optional[str]:
+    result = await db.execute(
+        select(StripeCustomer.user_id).where(StripeCustomer.stripe_customer_id == customer_id)
+    )
+    user_id = result.scalar()
+    if not user_id:
+        # Same backfill as get_stripe_customer_id, for customers that predate the index
+        result = await db.execute(
+            select(CustomerSubscription.user_id)
+            .where(CustomerSubscription.stripe_customer_id == customer_id)
+            .order_by(CustomerSubscription.created_at.desc())
+            .limit(1)
+        )
+        user_id = result.scalar()
+        if user_id:
+            await upsert_stripe_customer(db, user_id, customer_id)
+    return user_id
+
+async def upsert_stripe_customer(db: AsyncSession, user_id: str, customer_id: str, email: Optional[str] = None) -> None:
+    stmt = insert(StripeCustomer).values(user_id=user_id, stripe_customer_id=customer_id, email=email)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StripeCustomer.user_id],
+        set_={
+            'stripe_customer_id': stmt.excluded.stripe_customer_id,
+            'email': func.coalesce(stmt.excluded.email, StripeCustomer.email),
+        },
+    )
+    await db.execute(stmt)
+    await db.commit()
+    _remember_customer_id(user_id, customer_id)
+
+def metadata_fingerprint(metadata: dict) -> str:
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8")).hexdigest()
 
-    if not db_subscription:
-        db_subscription = CustomerSubscription(**subscription_data)
-        db.add(db_subscription)
-    else:
-        for key, value in subscription_data.items():
-            setattr(db_subscription, key, value)
+async def enqueue_clerk_metadata(db: AsyncSession, user_id: str, metadata: dict) -> None:
+    """
+    Record the latest Clerk metadata for a user in the outbox.
+    Pending updates for the same user collapse into one row, and an unchanged
+    fingerprint leaves the row (and its retry schedule) untouched.
+    """
+    stmt = insert(ClerkMetadataOutbox).values(
+        user_id=user_id,
+        metadata_payload=metadata,
+        fingerprint=metadata_fingerprint(metadata),
+        attempts=0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ClerkMetadataOutbox.user_id],
+        set_={
+            'metadata_payload': stmt.excluded.metadata_payload,
+            'fingerprint': stmt.excluded.fingerprint,
+            'attempts': 0,
+            'last_error': None,
+            'available_at': func.now(),
+            'updated_at': func.now(),
+        },
+        where=ClerkMetadataOutbox.fingerprint != stmt.excluded.fingerprint,
+    )
+    await db.execute(stmt)
+    await db.commit()
 
-    db.commit()
-    return db_subscription
\ No newline at end of file
+async def record_webhook_event(
+    db: AsyncSession,
+    event_id: str,
+    event_type: str,
+    payload: dict,
+    partition_key: str,
+    event_created: datetime
+) -> bool:
+    """Persist a verified Stripe event for the worker pool. Returns False for redeliveries."""
+    stmt = insert(StripeWebhookEvent).values(
+        id=event_id,
+        type=event_type,
+        payload=payload,
+        partition_key=partition_key,
+        event_created=event_created,
+    ).on_conflict_do_nothing(index_elements=[StripeWebhookEvent.id]).returning(StripeWebhookEvent.id)
+    inserted = (await db.execute(stmt)).scalar() is not None
+    await db.commit()
+    return inserted
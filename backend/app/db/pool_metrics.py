@@ -0,0 +1,73 @@
+# app/db/pool_metrics.py
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.utils.monitoring import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_CONNECTIONS_CREATED,
+    DB_POOL_INVALIDATIONS,
+    DB_POOL_PRE_PING_FAILURES,
+)
+
+
+class _TimedCheckout:
+    """Times _do_get, which is where a checkout waits for a free slot (or connects)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            # pool_logging_name carries the pool's metrics label
+            DB_POOL_CHECKOUT_WAIT.labels(pool=self.logging_name or "default").observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, pool_name: str) -> None:
+    """Export in-use/overflow gauges and connect/invalidate/pre-ping counters for a sync Engine"""
+    in_use = DB_POOL_CHECKED_OUT.labels(pool=pool_name)
+    overflow = DB_POOL_OVERFLOW.labels(pool=pool_name)
+    created = DB_POOL_CONNECTIONS_CREATED.labels(pool=pool_name)
+    pre_ping_failures = DB_POOL_PRE_PING_FAILURES.labels(pool=pool_name)
+
+    def report() -> None:
+        # Read from the pool rather than counting events, so detach/dispose can't drift the gauges
+        pool = engine.pool
+        in_use.set(pool.checkedout())
+        overflow.set(max(pool.overflow(), 0))
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        created.inc()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        report()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        report()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        DB_POOL_INVALIDATIONS.labels(pool=pool_name, kind="hard").inc()
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        DB_POOL_INVALIDATIONS.labels(pool=pool_name, kind="soft").inc()
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        if getattr(context, "is_pre_ping", False):
+            pre_ping_failures.inc()
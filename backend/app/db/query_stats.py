@@ -0,0 +1,84 @@
+# app/db/query_stats.py
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """
+    Statements executed (and time spent in them) within one request or block.
+    Collectors nest: a statement also counts towards every enclosing one, so
+    assert_max_queries sees the queries of the requests made inside it.
+    """
+    __slots__ = ("count", "duration", "statements", "parent")
+
+    def __init__(self, keep_statements: bool = False, parent: Optional["QueryStats"] = None):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Optional[List[str]] = [] if keep_statements else None
+        self.parent = parent
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+def start_query_stats(keep_statements: bool = False) -> QueryStats:
+    stats = QueryStats(keep_statements, parent=_query_stats.get())
+    _query_stats.set(stats)
+    return stats
+
+def end_query_stats(stats: QueryStats) -> None:
+    """Make the enclosing collector (if any) current again"""
+    _query_stats.set(stats.parent)
+
+def track_queries(engine) -> None:
+    """Count statements and log slow ones for a sync Engine (use .sync_engine for async engines)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+
+        stats = _query_stats.get()
+        while stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            if stats.statements is not None:
+                stats.statements.append(statement)
+            stats = stats.parent
+
+        if elapsed * 1000 >= settings.DATABASE_SLOW_QUERY_MS:
+            logger.warning(f"Slow query ({elapsed * 1000:.1f}ms): {' '.join(statement.split())[:1000]}")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute doesn't fire for a failed statement
+        start_times = context.connection.info.get("query_start_time") if context.connection is not None else None
+        if start_times:
+            start_times.pop()
+
+@contextmanager
+def assert_max_queries(max_queries: int):
+    """
+    Fail if the block runs more than max_queries statements, to catch N+1 regressions:
+
+        with assert_max_queries(2):
+            client.get("/api/v1/billing/subscription/current", headers=auth)
+    """
+    stats = start_query_stats(keep_statements=True)
+    try:
+        yield stats
+    finally:
+        end_query_stats(stats)
+    if stats.count > max_queries:
+        executed = "\n".join(f"  {i + 1}. {' '.join(s.split())}" for i, s in enumerate(stats.statements))
+        raise AssertionError(f"Expected at most {max_queries} queries, {stats.count} were executed:\n{executed}")
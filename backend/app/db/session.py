@@ -1,18 +1,27 @@
 # backend/app/db/session.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session, Session
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from fastapi import Request
 from app.config.settings import settings
+from app.db.pool_metrics import TimedQueuePool, TimedAsyncAdaptedQueuePool, instrument_engine
+from app.db.query_stats import track_queries
+from app.utils.monitoring import DB_SESSIONS
 import logging
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Optional
 
 logger = logging.getLogger(__name__)
 
-def get_sync_engine():
+def create_sync_engine():
     """Create and configure synchronous SQLAlchemy engine"""
-    return create_engine(
+    engine = create_engine(
         settings.DATABASE_URL,
+        poolclass=TimedQueuePool,
+        pool_logging_name="sync",
         pool_size=settings.DATABASE_POOL_SIZE,
         max_overflow=settings.DATABASE_MAX_OVERFLOW,
         pool_pre_ping=settings.DATABASE_POOL_PRE_PING,  # Check connections before use
@@ -23,48 +32,136 @@ def get_sync_engine():
             "keepalives_count": 5,
         }
     )
+    instrument_engine(engine, "sync")
+    track_queries(engine)
+    return engine
 
-def get_async_engine():
+def create_async_db_engine(url: Optional[str] = None, pool_name: str = "primary"):
     """Create and configure asynchronous SQLAlchemy engine"""
-    return create_async_engine(
-        settings.DATABASE_ASYNC_URL,
+    # keepalives_* are libpq (psycopg2) options, asyncpg rejects them
+    engine = create_async_engine(
+        url or settings.DATABASE_ASYNC_URL,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_logging_name=pool_name,
         pool_size=settings.DATABASE_POOL_SIZE,
         max_overflow=settings.DATABASE_MAX_OVERFLOW,
         pool_recycle=settings.DATABASE_POOL_RECYCLE,
         pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
-        connect_args={
-            "keepalives": 1,
-            "keepalives_idle": 30,
-            "keepalives_interval": 10,
-            "keepalives_count": 5,
-        }
     )
+    # Pool events are only exposed on the underlying sync Engine
+    instrument_engine(engine.sync_engine, pool_name)
+    track_queries(engine.sync_engine)
+    return engine
 
-# Synchronous session setup
-sync_engine = get_sync_engine()
-engine = sync_engine  # For backward compatibility
-SessionLocal = scoped_session(
-    sessionmaker(
-        autocommit=False,
+# Synchronous session setup, only built when a script asks for it
+@lru_cache(maxsize=None)
+def get_sync_engine():
+    return create_sync_engine()
+
+@lru_cache(maxsize=None)
+def get_sync_sessionmaker():
+    return scoped_session(
+        sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            bind=get_sync_engine(),
+            expire_on_commit=False  # Better for web apps
+        )
+    )
+
+# Asynchronous session setup, built on first use (or in the app lifespan) rather than at import
+@lru_cache(maxsize=None)
+def get_async_engine():
+    return create_async_db_engine()
+
+@lru_cache(maxsize=None)
+def get_async_sessionmaker():
+    return sessionmaker(
+        bind=get_async_engine(),
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+        autocommit=False
+    )
+
+# Optional read replica, only GET endpoints that tolerate replication lag use it
+@lru_cache(maxsize=None)
+def get_replica_engine():
+    if not settings.DATABASE_REPLICA_ASYNC_URL:
+        return None
+    return create_async_db_engine(settings.DATABASE_REPLICA_ASYNC_URL, pool_name="replica")
+
+@lru_cache(maxsize=None)
+def get_replica_sessionmaker():
+    engine = get_replica_engine()
+    if engine is None:
+        return None
+    return sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
         autoflush=False,
-        bind=sync_engine,
-        expire_on_commit=False  # Better for web apps
+        autocommit=False
     )
-)
-
-# Asynchronous session setup
-async_engine = get_async_engine()
-AsyncSessionLocal = sessionmaker(
-    bind=async_engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False,
-    autocommit=False
-)
+
+async def dispose_engines() -> None:
+    """Close pooled connections of the engines that were actually created"""
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_replica_engine.cache_info().currsize and get_replica_engine() is not None:
+        await get_replica_engine().dispose()
+
+_LAZY_ATTRIBUTES = {
+    "engine": get_sync_engine,
+    "sync_engine": get_sync_engine,
+    "SessionLocal": get_sync_sessionmaker,
+    "async_engine": get_async_engine,
+    "AsyncSessionLocal": get_async_sessionmaker,
+    "replica_engine": get_replica_engine,
+    "ReplicaSessionLocal": get_replica_sessionmaker,
+}
+
+def __getattr__(name: str):
+    # Backward compatibility for `from app.db.session import engine, AsyncSessionLocal, ...`
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Read-your-writes: a request that wrote gets a cookie pinning its reads to the primary
+PRIMARY_COOKIE = "db_primary_until"
+PRIMARY_HEADER = "X-Read-Primary"
+
+class WriteTracker:
+    """Per-request flag set as soon as a session executes anything but a SELECT"""
+    __slots__ = ("wrote",)
+
+    def __init__(self):
+        self.wrote = False
+
+_write_tracker: ContextVar[Optional[WriteTracker]] = ContextVar("db_write_tracker", default=None)
+
+def track_writes() -> WriteTracker:
+    tracker = WriteTracker()
+    _write_tracker.set(tracker)
+    return tracker
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_write(orm_execute_state):
+    tracker = _write_tracker.get()
+    if tracker is not None and not orm_execute_state.is_select:
+        tracker.wrote = True
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    if request.headers.get(PRIMARY_HEADER):
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
 
 def get_db():
-    """Synchronous dependency for FastAPI endpoints"""
-    db = SessionLocal()
+    """Synchronous session generator for scripts"""
+    db = get_sync_sessionmaker()()
     try:
         yield db
         db.commit()
@@ -77,12 +174,51 @@ def get_db():
 
 @asynccontextmanager
 async def async_get_db() -> AsyncGenerator[AsyncSession, None]:
-    """Asynchronous dependency for FastAPI endpoints"""
-    async with AsyncSessionLocal() as session:
+    """Asynchronous session context manager"""
+    async with get_async_sessionmaker()() as session:
         try:
             yield session
             await session.commit()
         except Exception as e:
             await session.rollback()
             logger.error(f"Async database error: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Asynchronous dependency for FastAPI endpoints"""
+    DB_SESSIONS.labels(pool="primary", reason="write").inc()
+    async with async_get_db() as session:
+        yield session
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Read-only dependency: uses the replica when one is configured, unless the
+    client just wrote (cookie) or explicitly asks for the primary (header).
+    """
+    replica_sessionmaker = get_replica_sessionmaker()
+    if replica_sessionmaker is None:
+        pool, reason, session_factory = "primary", "no_replica", get_async_sessionmaker()
+    elif reads_pinned_to_primary(request):
+        pool, reason, session_factory = "primary", "read_your_writes", get_async_sessionmaker()
+    else:
+        pool, reason, session_factory = "replica", "read", replica_sessionmaker
+    DB_SESSIONS.labels(pool=pool, reason=reason).inc()
+
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            # Nothing to commit on a read path, just end the transaction
+            await session.rollback()
+
+async def get_primary_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Read-only dependency on the primary, for reads that must see writes made
+    outside the client's own requests (e.g. by a webhook) right away.
+    """
+    DB_SESSIONS.labels(pool="primary", reason="fresh_read").inc()
+    async with get_async_sessionmaker()() as session:
+        try:
+            yield session
+        finally:
+            await session.rollback()
@@ -1,23 +1,83 @@
 # main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.db.session import engine
-from app.models.base import Base
+from app.db.session import async_get_db, get_async_engine, dispose_engines
 from app.utils.logging import logger, logging_middleware
 from app.api.v1.auth.router import router as auth_router
 from app.api.v1.billing.router import router as billing_router
 from app.api.v1.user.router import router as user_router
 from app.api.v1.core.router import router as core_router
-from app.utils.redis import close_redis
+from app.utils.redis import close_redis, cache_invalidation_listener
+from app.utils.clerk import clerk_client
 from app.utils.monitoring import (
     prometheus_middleware,
     metrics_endpoint,
     init_sentry
 )
+from app.api.middleware.read_your_writes import read_your_writes_middleware
+from app.api.middleware.query_stats import query_stats_middleware
 from app.api.middleware.rate_limiter import init_rate_limiter, rate_limit_exception_handler, get_limit
+from app.api.deps import init_clerk_auth, close_clerk_auth
+from app.workers.clerk_sync import clerk_sync_worker
+from app.workers.stripe_webhooks import webhook_worker_pool
+from app.models.stripe import stripe_service
+from app.utils.plan_catalog import plan_catalog
 from app.config.settings import settings
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Everything with side effects (engines, clients, Sentry, workers) starts here, not at import
+    try:
+        # Sentry initialization (if configured)
+        init_sentry()
+
+        # The schema is managed by Alembic (alembic upgrade head), not at boot
+        get_async_engine()
+        async with async_get_db() as db:
+            await plan_catalog.start(db)
+        logger.info("Plan catalog loaded")
+
+        await cache_invalidation_listener.start()
+        logger.info("L1 cache invalidation listener started")
+        
+        # Initialize Redis rate limiter
+        await init_rate_limiter()
+        logger.info("Rate limiter initialized")
+
+        # Warm the JWKS cache so requests never wait on Clerk
+        await init_clerk_auth()
+        logger.info("Clerk JWKS store initialized")
+
+        await clerk_sync_worker.start()
+        logger.info("Clerk metadata sync worker started")
+
+        await webhook_worker_pool.start()
+        logger.info("Stripe webhook worker pool started")
+        
+    except Exception as e:
+        logger.error("Failed during startup", exc_info=True)
+        raise
+
+    yield
+
+    try:
+        await webhook_worker_pool.stop()
+        await clerk_sync_worker.stop()
+        await plan_catalog.stop()
+        await cache_invalidation_listener.stop()
+        await close_clerk_auth()
+        await close_redis()
+        logger.info("Redis connection closed")
+        await clerk_client.close()
+        logger.info("Clerk HTTP client closed")
+        stripe_service.close()
+        await dispose_engines()
+        logger.info("Database engines disposed")
+    except Exception as e:
+        logger.error("Error during shutdown", exc_info=True)
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title="Your SaaS API",
@@ -33,7 +93,8 @@ def create_app() -> FastAPI:
             }
         ],
         # Security headers
-        openapi_tags=settings.OPENAPI_TAGS_METADATA
+        openapi_tags=settings.OPENAPI_TAGS_METADATA,
+        lifespan=lifespan
     )
     return app
 
@@ -47,8 +108,11 @@ app.middleware("http")(prometheus_middleware)
 # Request logging middleware
 app.middleware("http")(logging_middleware)
 
-# Sentry initialization (if configured)
-init_sentry()
+# Per-request SQL statement count and time (Server-Timing header outside production)
+app.middleware("http")(query_stats_middleware)
+
+# Pins reads to the primary right after a write (only active with a replica)
+app.middleware("http")(read_your_writes_middleware)
 
 # Metrics route
 app.add_api_route("/metrics", metrics_endpoint, methods=["GET"])
@@ -73,30 +137,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Startup and shutdown events
-@app.on_event("startup")
-async def startup():
-    try:
-        # Initialize database
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables initialized")
-        
-        # Initialize Redis rate limiter
-        await init_rate_limiter()
-        logger.info("Rate limiter initialized")
-        
-    except Exception as e:
-        logger.error("Failed during startup", exc_info=True)
-        raise
-
-@app.on_event("shutdown")
-async def shutdown():
-    try:
-        await close_redis()
-        logger.info("Redis connection closed")
-    except Exception as e:
-        logger.error("Error during shutdown", exc_info=True)
-
 # Routers
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(billing_router, prefix="/api/v1/billing", tags=["billing"])
@@ -1,3 +1,4 @@
+from functools import cached_property
 from typing import Any, Optional, Dict
 
 from fastapi import HTTPException, Request
@@ -5,26 +6,31 @@ from fastapi.openapi.models import HTTPBearer as HTTPBearerModel
 from fastapi.security import HTTPAuthorizationCredentials as FastAPIHTTPAuthorizationCredentials, HTTPBearer
 from fastapi.security.utils import get_authorization_scheme_param
 import jwt
-from jwt import PyJWKClient
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from starlette.status import HTTP_403_FORBIDDEN
 from typing_extensions import Annotated, Doc
 from pydantic import BaseModel
 from app.utils.clerk import clerk_client
+from app.utils.jwks import JWKSKeyStore
+from app.utils.token_cache import VerifiedTokenCache
 
 
 class ClerkConfig(BaseModel):
     jwks_url: str
+    public_key: Optional[str] = None  # PEM, enables offline verification
+    jwks_fallback: bool = True  # Use the JWKS when the PEM no longer matches (key rotation)
     audience: Optional[str] = None
     issuer: Optional[str] = None
     verify_exp: bool = True
     verify_aud: bool = False
     verify_iss: bool = False
-    jwks_cache_keys: bool = False
-    jwks_max_cached_keys: int = 16
-    jwks_cache_set: bool = True
     jwks_lifespan: int = 300
+    jwks_refresh_margin: float = 0.2  # Refresh when this fraction of the lifespan is left
+    jwks_min_refresh_interval: int = 10  # Rate limit for refreshes triggered by unknown kids
     jwks_headers: Optional[Dict[str, Any]] = None
     jwks_client_timeout: int = 30
+    token_cache_size: int = 1024  # 0 disables the verified-token cache
+    token_cache_max_ttl: Optional[int] = None  # Cap on how long claims are reused, defaults to exp
 
 
 class HTTPAuthorizationCredentials(FastAPIHTTPAuthorizationCredentials):
@@ -50,14 +56,17 @@ class ClerkHTTPBearer(HTTPBearer):
         self.jwks_url = config.jwks_url
         self.audience = config.audience
         self.issuer = config.issuer
-        self.jwks_client = PyJWKClient(
-            uri=config.jwks_url,
-            cache_keys=config.jwks_cache_keys,
-            max_cached_keys=config.jwks_max_cached_keys,
-            cache_jwk_set=config.jwks_cache_set,
+        self.jwks_store = JWKSKeyStore(
+            jwks_url=config.jwks_url,
             lifespan=config.jwks_lifespan,
             headers=config.jwks_headers,
             timeout=config.jwks_client_timeout,
+            refresh_margin=config.jwks_refresh_margin,
+            min_refresh_interval=config.jwks_min_refresh_interval,
+        )
+        self.token_cache = VerifiedTokenCache(
+            max_size=config.token_cache_size,
+            max_ttl=config.token_cache_max_ttl,
         )
         self.debug_mode = debug_mode
 
@@ -67,21 +76,57 @@ class ClerkHTTPBearer(HTTPBearer):
         if not self.config.issuer and self.config.verify_iss:
             raise ValueError("Issuer must be set in config because verify_iss is True")
 
-    def _decode_token(self, token: str) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _load_public_key(pem: str):
+        # Env files often carry the PEM on one line with escaped newlines
+        return load_pem_public_key(pem.replace("\\n", "\n").strip().encode("utf-8"))
+
+    @cached_property
+    def public_key(self):
+        # Parsed once on first use (not at import), offline verification never touches the network
+        return self._load_public_key(self.config.public_key) if bool(self.config.public_key) else None
+
+    @property
+    def offline(self) -> bool:
+        return bool(self.config.public_key)
+
+    async def _get_jwks_key(self, token: str):
+        header = jwt.get_unverified_header(token)
+        signing_key = await self.jwks_store.get_signing_key(header.get("kid"))
+        return signing_key.key
+
+    def _verify(self, token: str, key) -> Dict[str, Any]:
+        return jwt.decode(
+            token,
+            key=key,
+            audience=self.audience,
+            issuer=self.issuer,
+            algorithms=["RS256"],
+            options={
+                "verify_exp": self.config.verify_exp,
+                "verify_aud": self.config.verify_aud,
+                "verify_iss": self.config.verify_iss,
+            },
+        )
+
+    async def _decode_token(self, token: str) -> Optional[Dict[str, Any]]:
+        cached_claims = self.token_cache.get(token)
+        if cached_claims is not None:
+            return cached_claims
+
         try:
-            signing_key = self.jwks_client.get_signing_key_from_jwt(token)
-            return jwt.decode(
-                token,
-                key=signing_key.key,
-                audience=self.audience,
-                issuer=self.issuer,
-                algorithms=["RS256"],
-                options={
-                    "verify_exp": self.config.verify_exp,
-                    "verify_aud": self.config.verify_aud,
-                    "verify_iss": self.config.verify_iss,
-                },
-            )
+            if self.public_key is not None:
+                try:
+                    decoded = self._verify(token, self.public_key)
+                except jwt.InvalidSignatureError:
+                    if not self.config.jwks_fallback:
+                        raise
+                    # Signed with a key newer than CLERK_JWT_PUBLIC_KEY
+                    decoded = self._verify(token, await self._get_jwks_key(token))
+            else:
+                decoded = self._verify(token, await self._get_jwks_key(token))
+            self.token_cache.set(token, decoded)
+            return decoded
         except Exception as e:
             if self.debug_mode:
                 raise e
@@ -106,7 +151,7 @@ class ClerkHTTPBearer(HTTPBearer):
                 raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Invalid authentication credentials")
             return None
 
-        decoded_token = self._decode_token(token=credentials)
+        decoded_token = await self._decode_token(token=credentials)
         if not decoded_token and self.auto_error:
             raise HTTPException(status_code=HTTP_403_FORBIDDEN, detail="Invalid authentication credentials")
 
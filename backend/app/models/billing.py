@@ -1,6 +1,7 @@
 # app/models.py
 from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, ARRAY, MetaData, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, ARRAY, MetaData, Index, text, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 import enum
 from .base import Base
@@ -37,11 +38,15 @@ class ScheduledChangeType(str, enum.Enum):
 
 class CustomerSubscription(Base):
     __tablename__ = "customer_subscriptions"
+    __table_args__ = (
+        # Only rows that can still be "the" subscription of a user; see migrations/versions/0002
+        Index('ix_customer_subscriptions_user_active', 'user_id', postgresql_where=text("status <> 'CANCELED'")),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(String, index=True, nullable=False)
-    stripe_customer_id = Column(String, unique=True, nullable=False)
-    stripe_subscription_id = Column(String, index=True)
+    stripe_customer_id = Column(String, index=True, nullable=False)  # A customer can resubscribe
+    stripe_subscription_id = Column(String, unique=True, index=True)  # Upsert conflict target
     plan_id = Column(Integer, ForeignKey('subscription_plans.id', ondelete='RESTRICT'))
     status = Column(SQLEnum(SubscriptionStatus), default=SubscriptionStatus.INCOMPLETE)
     current_period_start = Column(DateTime(timezone=True), nullable=True)
@@ -50,9 +55,10 @@ class CustomerSubscription(Base):
     trial_start = Column(DateTime(timezone=True), nullable=True)
     trial_end = Column(DateTime(timezone=True), nullable=True)
     scheduled_change_type = Column(SQLEnum(ScheduledChangeType), nullable=True)
-    scheduled_change_date = Column(DateTime(timezone=True), nullable=True)
+    scheduled_change_date = Column(DateTime(timezone=True), nullable=True, index=True)
     scheduled_plan_id = Column(Integer, ForeignKey('subscription_plans.id', ondelete='RESTRICT'), nullable=True)
     last_metadata_sync = Column(DateTime(timezone=True), nullable=True)
+    last_event_at = Column(DateTime(timezone=True), nullable=True)  # `created` of the last applied Stripe event
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -60,3 +66,46 @@ class CustomerSubscription(Base):
     plan = relationship("SubscriptionPlan", foreign_keys=[plan_id], backref="subscriptions")
     scheduled_plan = relationship("SubscriptionPlan", foreign_keys=[scheduled_plan_id])
 
+class StripeCustomer(Base):
+    """Clerk user to Stripe customer mapping, so checkout never has to search Stripe"""
+    __tablename__ = "stripe_customers"
+
+    user_id = Column(String, primary_key=True)
+    stripe_customer_id = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ClerkMetadataOutbox(Base):
+    """Latest Clerk public metadata per user, waiting to be pushed by the sync worker"""
+    __tablename__ = "clerk_metadata_outbox"
+
+    user_id = Column(String, primary_key=True)
+    metadata_payload = Column(JSONB, nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+    synced_fingerprint = Column(String(64), nullable=True)  # Fingerprint last accepted by Clerk
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class WebhookEventStatus(str, enum.Enum):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    PROCESSED = 'processed'
+    DEAD = 'dead'  # Out of retries, kept as the dead-letter store
+
+class StripeWebhookEvent(Base):
+    """Raw, signature-verified Stripe events waiting for (or done with) processing"""
+    __tablename__ = "stripe_webhook_events"
+
+    id = Column(String, primary_key=True)  # Stripe event ID
+    type = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    partition_key = Column(String, nullable=False, index=True)  # Usually the Stripe subscription ID
+    event_created = Column(DateTime(timezone=True), nullable=False)  # Stripe's `created`
+    status = Column(SQLEnum(WebhookEventStatus), default=WebhookEventStatus.PENDING, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    available_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
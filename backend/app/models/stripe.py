@@ -1,24 +1,86 @@
 # models/stripe.py
+import asyncio
 import stripe
-from typing import Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Any
 import os
 from fastapi import HTTPException
+from app.config.settings import settings
+from app.utils.monitoring import (
+    STRIPE_API_LATENCY,
+    STRIPE_API_ERRORS,
+    STRIPE_POOL_WAIT,
+    STRIPE_POOL_IN_FLIGHT,
+    STRIPE_POOL_ACTIVE
+)
 
 
 class StripeServiceError(Exception):
     pass
 
 class StripeService:
-    def __init__(self):
+    def __init__(self, max_workers: int = settings.STRIPE_MAX_WORKERS):
         self.stripe = stripe
-        stripe_key = os.getenv('STRIPE_SECRET_KEY')
-        if not stripe_key:
-            raise ValueError("STRIPE_SECRET_KEY must be set")
-        self.stripe.api_key = stripe_key
+        self.max_workers = max_workers
+        # Built on the first call, so importing the module has no side effects
+        self._executor: Optional[ThreadPoolExecutor] = None
 
-    def create_checkout_session(
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            stripe_key = os.getenv('STRIPE_SECRET_KEY')
+            if not stripe_key:
+                raise ValueError("STRIPE_SECRET_KEY must be set")
+            self.stripe.api_key = stripe_key
+            # The SDK is blocking, so calls run on a bounded pool instead of the event loop
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stripe")
+        return self._executor
+
+    async def _run(self, operation: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking Stripe SDK call on the dedicated thread pool"""
+        queued_at = time.perf_counter()
+
+        def call():
+            started_at = time.perf_counter()
+            STRIPE_POOL_WAIT.observe(started_at - queued_at)
+            STRIPE_POOL_ACTIVE.inc()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                STRIPE_API_ERRORS.labels(operation=operation).inc()
+                raise
+            finally:
+                STRIPE_POOL_ACTIVE.dec()
+                STRIPE_API_LATENCY.labels(operation=operation).observe(time.perf_counter() - started_at)
+
+        STRIPE_POOL_IN_FLIGHT.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), call)
+        finally:
+            STRIPE_POOL_IN_FLIGHT.dec()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def create_customer(self, email: str, user_id: str) -> stripe.Customer:
+        """Create a Stripe customer for a Clerk user"""
+        try:
+            return await self._run(
+                "customer_create",
+                self.stripe.Customer.create,
+                email=email,
+                metadata={'clerk_user_id': user_id},
+                # Concurrent checkouts for the same user must not create two customers
+                idempotency_key=f"customer-create-{user_id}"
+            )
+        except self.stripe.error.StripeError as e:
+            raise StripeServiceError(f"Stripe error: {str(e)}")
+
+    async def create_checkout_session(
         self,
-        email: str,
+        customer_id: str,
         user_id: str,
         price_id: str,
         success_url: str,
@@ -26,21 +88,10 @@ class StripeService:
     ) -> stripe.checkout.Session:
         """Create a Stripe Checkout session for subscription"""
         try:
-            # First, check if customer exists
-            customers = self.stripe.Customer.list(email=email)
-            
-            if customers.data:
-                customer = customers.data[0]
-            else:
-                # Create a new customer if one doesn't exist
-                customer = self.stripe.Customer.create(
-                    email=email,
-                    metadata={'clerk_user_id': user_id}
-                )
-
-            # Create the checkout session
-            session = self.stripe.checkout.Session.create(
-                customer=customer.id,
+            session = await self._run(
+                "checkout_session_create",
+                self.stripe.checkout.Session.create,
+                customer=customer_id,
                 payment_method_types=['card'],
                 mode='subscription',
                 line_items=[{
@@ -68,6 +119,7 @@ class StripeService:
 
     def verify_webhook(self, payload: bytes, signature: str) -> stripe.Event:
         """Verify Stripe webhook signature and return the event"""
+        # Local HMAC check, cheap enough to stay on the event loop
         webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
         if not webhook_secret:
             raise StripeServiceError("Webhook secret not configured")
@@ -84,17 +136,19 @@ class StripeService:
         except Exception as e:
             raise StripeServiceError(f"Could not verify Webhook, error: {str(e)}")
 
-    def get_subscription(self, subscription_id: str) -> stripe.Subscription:
+    async def get_subscription(self, subscription_id: str) -> stripe.Subscription:
         """Retrieve subscription details from Stripe"""
         try:
-            return self.stripe.Subscription.retrieve(subscription_id)
+            return await self._run("subscription_retrieve", self.stripe.Subscription.retrieve, subscription_id)
         except stripe.error.StripeError as e:
             raise StripeServiceError(f"Error retrieving subscription: {str(e)}")
-        
-    def create_portal_session(self, customer_id: str, return_url: str) -> stripe.billing_portal.Session:
+
+    async def create_portal_session(self, customer_id: str, return_url: str) -> stripe.billing_portal.Session:
         """Create a Stripe Billing Portal session for a customer"""
         try:
-            session = self.stripe.billing_portal.Session.create(
+            session = await self._run(
+                "portal_session_create",
+                self.stripe.billing_portal.Session.create,
                 customer=customer_id,
                 return_url=return_url
             )
@@ -104,5 +158,5 @@ class StripeService:
         except Exception as e:
             raise StripeServiceError(f"Unexpected error: {str(e)}")
 
-# Create a singleton instance
-stripe_service = StripeService()
\ No newline at end of file
+# Create a singleton instance (cheap, the thread pool is created on first use)
+stripe_service = StripeService()
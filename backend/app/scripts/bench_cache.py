@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import pickle
+import time
+from datetime import datetime, timedelta, timezone
+
+from pydantic import TypeAdapter
+
+from app.models.billing import SubscriptionStatus
+from app.schemas.billing import Plan, SubscriptionResponse
+from app.utils.redis import build_cache_key, close_redis, get_redis
+
+def sample_plans(count: int = 3) -> list:
+    return [
+        Plan(
+            id=i,
+            name=f"Plan {i}",
+            description="Ideal for growing businesses",
+            price=29.99,
+            features=["Up to 10,000 API calls/month", "Priority support", "Advanced analytics"],
+            stripe_price_id=f"price_{i:024d}",
+            stripe_product_id=f"prod_{i:014d}",
+            billing_interval="month",
+            is_active=True,
+        )
+        for i in range(count)
+    ]
+
+def sample_subscription() -> SubscriptionResponse:
+    now = datetime.now(timezone.utc)
+    return SubscriptionResponse(
+        id=1,
+        user_id="user_2abcdefghijklmnopqrstuvwxyz",
+        stripe_customer_id="cus_0000000000000",
+        stripe_subscription_id="sub_000000000000000000000000",
+        plan_id=2,
+        status=SubscriptionStatus.ACTIVE,
+        current_period_start=now,
+        current_period_end=now + timedelta(days=30),
+        cancel_at_period_end=False,
+        created_at=now,
+    )
+
+def timeit(label: str, func, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<34} {elapsed / iterations * 1e6:>8.2f} us/op")
+    return elapsed
+
+def bench_serialization(iterations: int) -> None:
+    for name, model, value in (
+        ("plans", list[Plan], sample_plans()),
+        ("subscription", SubscriptionResponse, sample_subscription()),
+    ):
+        adapter = TypeAdapter(model)
+        legacy = pickle.dumps(value)
+        current = adapter.dump_json(value)
+        print(f"{name}: pickle {len(legacy)} bytes, json {len(current)} bytes")
+        # Legacy hit: unpickle, then FastAPI validates and serializes the response again
+        timeit("legacy hit (unpickle + re-serialize)",
+               lambda: adapter.dump_json(adapter.validate_python(pickle.loads(legacy))), iterations)
+        # New hit: the stored bytes are the response body
+        timeit("new hit (bytes as-is)", lambda: bytes(current), iterations)
+        timeit("legacy miss (pickle)", lambda: pickle.dumps(value), iterations)
+        timeit("new miss (validate + dump_json)",
+               lambda: adapter.dump_json(adapter.validate_python(value, from_attributes=True)), iterations)
+
+    fields = {"user_id"}
+    bound = {"user_data": {"sub": "user_2abcdefghijklmnopqrstuvwxyz"}, "db": object()}
+    timeit("key build (user scoped)", lambda: build_cache_key("user:{user_id}:subscription", fields, bound), iterations)
+
+async def bench_redis(iterations: int) -> None:
+    redis = await get_redis()
+    adapter = TypeAdapter(list[Plan])
+    value = sample_plans()
+    await redis.set("bench:cache:legacy", pickle.dumps(value), ex=60)
+    await redis.set("bench:cache:new", adapter.dump_json(value), ex=60)
+
+    for label, key, decode in (
+        ("legacy hit via Redis", "bench:cache:legacy", lambda raw: adapter.dump_json(adapter.validate_python(pickle.loads(raw)))),
+        ("new hit via Redis", "bench:cache:new", lambda raw: raw),
+    ):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            decode(await redis.get(key))
+        elapsed = time.perf_counter() - started
+        print(f"  {label:<34} {elapsed / iterations * 1e6:>8.1f} us/op")
+
+    await redis.delete("bench:cache:legacy", "bench:cache:new")
+    await close_redis()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the legacy pickle cache path with the JSON response cache")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--redis", action="store_true", help="Also measure round trips against the configured Redis")
+    args = parser.parse_args()
+
+    bench_serialization(args.iterations)
+    if args.redis:
+        asyncio.run(bench_redis(max(args.iterations // 20, 100)))
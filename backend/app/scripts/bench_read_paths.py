@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from app.db.session import get_async_sessionmaker
+from app.crud.billing import IS_ACTIVE_SUBSCRIPTION, get_active_subscription_response
+from app.models.billing import CustomerSubscription, SubscriptionPlan
+from app.schemas.billing import Plan, SubscriptionResponse
+from app.utils.plan_catalog import CatalogPlan
+
+async def orm_plans(db):
+    result = await db.execute(select(SubscriptionPlan))
+    return [Plan.model_validate(plan) for plan in result.scalars().all()]
+
+async def projection_plans(db):
+    result = await db.execute(select(*CatalogPlan.columns()))
+    return [Plan.model_construct(**row._mapping) for row in result.all()]
+
+async def orm_subscription(db, user_id):
+    result = await db.execute(
+        select(CustomerSubscription).where(CustomerSubscription.user_id == user_id, IS_ACTIVE_SUBSCRIPTION)
+    )
+    subscription = result.scalars().first()
+    return SubscriptionResponse.model_validate(subscription) if subscription else None
+
+async def projection_subscription(db, user_id):
+    return await get_active_subscription_response(db, user_id)
+
+async def bench(label: str, func, iterations: int, *args) -> float:
+    async with get_async_sessionmaker()() as db:
+        for _ in range(min(iterations, 50)):  # Warm up connections and statement caches
+            await func(db, *args)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await func(db, *args)
+            # Drop the identity map like a fresh request session would
+            db.expunge_all()
+        elapsed = time.perf_counter() - started
+    print(f"{label:<28} {iterations / elapsed:>10.0f} ops/s  {elapsed / iterations * 1e6:>8.1f} us/op")
+    return elapsed
+
+async def main(iterations: int, user_id: str) -> None:
+    if not user_id:
+        async with get_async_sessionmaker()() as db:
+            user_id = (await db.execute(
+                select(CustomerSubscription.user_id).where(IS_ACTIVE_SUBSCRIPTION).limit(1)
+            )).scalar()
+        if not user_id:
+            print("No active subscription found, pass --user-id; benchmarking plans only")
+
+    orm = await bench("plans (ORM + from_attributes)", orm_plans, iterations)
+    projection = await bench("plans (projection)", projection_plans, iterations)
+    print(f"  speedup x{orm / projection:.2f}")
+
+    if user_id:
+        orm = await bench("subscription (ORM)", orm_subscription, iterations, user_id)
+        projection = await bench("subscription (projection)", projection_subscription, iterations, user_id)
+        print(f"  speedup x{orm / projection:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare ORM and projection read paths")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--user-id", default=None, help="User with an active subscription (defaults to any)")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations, args.user_id))
@@ -0,0 +1,48 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Cumulative `import app.main` budget; raise it deliberately, not to make a regression pass
+DEFAULT_BUDGET_MS = 1500
+
+def measure(module: str) -> list:
+    """Run `python -X importtime` in a fresh interpreter and return (cumulative_us, name) rows"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    if result.returncode != 0:
+        # Import errors are interleaved with the timing lines on stderr
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise SystemExit(f"Importing {module} failed:\n" + "\n".join(errors))
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return rows
+
+def check_import_time(module: str, budget_ms: float, top: int) -> bool:
+    rows = measure(module)
+    total_ms = next(cumulative for cumulative, name in rows if name == module) / 1000
+
+    print(f"Slowest imports (cumulative) under {module}:")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative / 1000:>8.1f}ms  {name}")
+
+    ok = total_ms <= budget_ms
+    print(f"{'OK' if ok else 'FAIL'}  import {module}: {total_ms:.1f}ms (budget {budget_ms:.0f}ms)")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if importing the app exceeds its time budget")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    sys.exit(0 if check_import_time(args.module, args.budget_ms, args.top) else 1)
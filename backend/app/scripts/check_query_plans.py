@@ -0,0 +1,72 @@
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.db.session import get_db
+from app.crud.billing import IS_ACTIVE_SUBSCRIPTION, CURRENT_SUBSCRIPTION_ORDER
+from app.models.billing import CustomerSubscription
+
+# Hot billing lookups and the index each one must use (see migrations/versions/0002)
+CHECKS = [
+    (
+        "active subscription by user",
+        select(CustomerSubscription)
+        .where(CustomerSubscription.user_id == "user_check", IS_ACTIVE_SUBSCRIPTION)
+        .order_by(*CURRENT_SUBSCRIPTION_ORDER)
+        .limit(1),
+        "ix_customer_subscriptions_user_active",
+    ),
+    (
+        "subscription by Stripe customer",
+        select(CustomerSubscription.stripe_customer_id).where(CustomerSubscription.stripe_customer_id == "cus_check"),
+        "ix_customer_subscriptions_stripe_customer_id",
+    ),
+    (
+        "subscription by Stripe subscription",
+        select(CustomerSubscription.user_id).where(CustomerSubscription.stripe_subscription_id == "sub_check"),
+        "ix_customer_subscriptions_stripe_subscription_id",
+    ),
+    (
+        "upcoming scheduled changes",
+        select(CustomerSubscription.id).where(
+            CustomerSubscription.scheduled_change_date.between(
+                datetime.now(timezone.utc), datetime.now(timezone.utc) + timedelta(days=1)
+            )
+        ),
+        "ix_customer_subscriptions_scheduled_change_date",
+    ),
+]
+
+def plan_indexes(node: dict) -> set:
+    """Every index name referenced anywhere in an EXPLAIN (FORMAT JSON) plan"""
+    found = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        found |= plan_indexes(child)
+    return found
+
+def check_query_plans() -> bool:
+    db = next(get_db())
+    ok = True
+    try:
+        # Small tables would otherwise be sequentially scanned no matter which indexes exist
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        for name, stmt, index in CHECKS:
+            sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            raw = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            used = plan_indexes(plan)
+            if index in used:
+                print(f"OK    {name}: {index}")
+            else:
+                ok = False
+                print(f"FAIL  {name}: expected {index}, plan used {sorted(used) or 'no index'}")
+        db.rollback()
+    finally:
+        db.close()
+    return ok
+
+if __name__ == "__main__":
+    sys.exit(0 if check_query_plans() else 1)
@@ -0,0 +1,178 @@
+import argparse
+import os
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Optional
+
+import stripe
+from sqlalchemy import select
+
+from app.db.session import get_db
+from app.crud.billing import subscription_upsert_statement
+from app.models.billing import CustomerSubscription, SubscriptionPlan, SubscriptionStatus, ScheduledChangeType, StripeCustomer
+from app.config.settings import settings
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+if not stripe.api_key:
+    raise ValueError("STRIPE_SECRET_KEY must be set")
+
+# Columns owned by Stripe; anything else on the row is left alone
+SYNCED_FIELDS = (
+    'user_id',
+    'stripe_customer_id',
+    'plan_id',
+    'status',
+    'current_period_start',
+    'current_period_end',
+    'cancel_at_period_end',
+    'trial_start',
+    'trial_end',
+    'scheduled_change_type',
+    'scheduled_change_date',
+)
+
+def to_datetime(timestamp: Optional[int]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp else None
+
+def read_checkpoint(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+def write_checkpoint(path: str, subscription_id: str) -> None:
+    # Write then rename so an interrupted run never leaves a truncated checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(subscription_id)
+    os.replace(tmp_path, path)
+
+def load_state(db):
+    """Everything needed to diff in memory, loaded with one query per table"""
+    plan_ids = dict(db.execute(select(SubscriptionPlan.stripe_price_id, SubscriptionPlan.id)).all())
+    customer_users = dict(db.execute(select(StripeCustomer.stripe_customer_id, StripeCustomer.user_id)).all())
+
+    columns = [getattr(CustomerSubscription, field) for field in SYNCED_FIELDS]
+    rows = db.execute(select(CustomerSubscription.stripe_subscription_id, *columns)).all()
+    existing = {
+        row.stripe_subscription_id: {field: getattr(row, field) for field in SYNCED_FIELDS}
+        for row in rows
+        if row.stripe_subscription_id
+    }
+    return plan_ids, customer_users, existing
+
+def to_row(subscription, plan_ids: dict, customer_users: dict, existing_row: Optional[dict]) -> Optional[dict]:
+    """Map a Stripe subscription onto customer_subscriptions columns, None if it can't be attributed"""
+    user_id = (
+        (subscription.metadata or {}).get("clerk_user_id")
+        or customer_users.get(subscription.customer)
+        or (existing_row or {}).get('user_id')
+    )
+    if not user_id:
+        return None
+
+    items = subscription["items"]["data"]
+    price_id = items[0]["price"]["id"] if items else None
+    cancel_at = to_datetime(subscription.get("cancel_at"))
+
+    return {
+        'user_id': user_id,
+        'stripe_customer_id': subscription.customer,
+        'plan_id': plan_ids.get(price_id),
+        'status': SubscriptionStatus(subscription.status),
+        'current_period_start': to_datetime(subscription.get("current_period_start")),
+        'current_period_end': to_datetime(subscription.get("current_period_end")),
+        'cancel_at_period_end': bool(subscription.cancel_at_period_end),
+        'trial_start': to_datetime(subscription.get("trial_start")),
+        'trial_end': to_datetime(subscription.get("trial_end")),
+        'scheduled_change_type': ScheduledChangeType.CANCEL if cancel_at else None,
+        'scheduled_change_date': cancel_at,
+    }
+
+def flush(db, rows: list, dry_run: bool) -> None:
+    if dry_run or not rows:
+        return
+    # One multi-row INSERT ... ON CONFLICT DO UPDATE. Rows are stamped with their page's
+    # fetch time as last_event_at, so the upsert's stale guard keeps any webhook write
+    # newer than the snapshot
+    db.execute(subscription_upsert_statement(rows, returning=False))
+    db.commit()
+
+def reconcile(page_size: int, checkpoint_file: str, dry_run: bool = False) -> None:
+    """Resync customer_subscriptions from Stripe, writing only rows that drifted"""
+    db = next(get_db())
+    try:
+        plan_ids, customer_users, existing = load_state(db)
+        print(f"Loaded {len(existing)} local subscriptions and {len(plan_ids)} plans")
+
+        starting_after = read_checkpoint(checkpoint_file)
+        if starting_after:
+            print(f"Resuming after {starting_after}")
+
+        started = time.monotonic()
+        seen = changed = skipped = 0
+
+        # One Stripe page at a time: its drifted rows are written and the checkpoint
+        # moves after every page, however few rows changed
+        while True:
+            params = {"status": "all", "limit": page_size}
+            if starting_after:
+                params["starting_after"] = starting_after
+            fetched_at = datetime.now(timezone.utc)
+            page = stripe.Subscription.list(**params)
+            if not page.data:
+                break
+
+            rows = []
+            for subscription in page.data:
+                seen += 1
+                current = existing.get(subscription.id)
+                row = to_row(subscription, plan_ids, customer_users, current)
+
+                if row is None:
+                    skipped += 1
+                elif row != current:
+                    rows.append({**row, 'stripe_subscription_id': subscription.id, 'last_event_at': fetched_at})
+
+            changed += len(rows)
+            flush(db, rows, dry_run)
+            starting_after = page.data[-1].id
+            if not dry_run:
+                write_checkpoint(checkpoint_file, starting_after)
+
+            if seen % 1000 < page_size:
+                elapsed = time.monotonic() - started
+                print(f"{seen} scanned, {changed} written, {skipped} skipped ({seen / elapsed:.0f} subs/s)")
+
+            if not page.has_more:
+                break
+
+        elapsed = time.monotonic() - started
+        print(
+            f"Done: {seen} scanned, {changed} {'would be ' if dry_run else ''}written, "
+            f"{skipped} skipped in {elapsed:.1f}s ({seen / max(elapsed, 1e-9):.0f} subs/s)"
+        )
+        # A completed run starts from scratch next time
+        if not dry_run and os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+
+    except Exception as e:
+        print(f"Error reconciling subscriptions: {str(e)}")
+        traceback.print_exc()
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile customer_subscriptions with Stripe")
+    parser.add_argument("--page-size", type=int, default=100, help="Stripe page size (max 100), written and checkpointed per page")
+    parser.add_argument("--checkpoint-file", default=".reconcile_checkpoint")
+    parser.add_argument("--reset", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="Diff only, write nothing")
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.checkpoint_file):
+        os.remove(args.checkpoint_file)
+    reconcile(args.page_size, args.checkpoint_file, args.dry_run)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import time
 import traceback
@@ -7,8 +8,10 @@ from sqlalchemy.orm import Session
 
 # Set up proper imports from your current project
 from app.db.session import get_db, engine
-from app.models.billing import SubscriptionPlan, Base
+from app.models.billing import SubscriptionPlan
 from app.config.settings import settings
+from app.utils.plan_catalog import plan_catalog
+from app.utils.redis import close_redis, invalidate_tags
 
 # Initialize Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -111,6 +114,13 @@ def plans_already_seeded(db: Session) -> bool:
 
     return True
 
+async def notify_plan_change():
+    try:
+        await plan_catalog.publish_invalidation()
+        await invalidate_tags("plans")
+    finally:
+        await close_redis()
+
 def seed_plans():
     """Seed the subscription plans in both Stripe and the local database."""
     db = next(get_db())
@@ -120,10 +130,10 @@ def seed_plans():
             print("Plans are already seeded. Skipping script execution.")
             return
 
-        # Wait for table or create it
+        # Tables are created by the migrations (alembic upgrade head)
         if not wait_for_table(db):
-            print("Creating database tables...")
-            Base.metadata.create_all(bind=engine)
+            print("subscription_plans table not found, run `alembic upgrade head` first")
+            return
 
         print("Clearing existing data...")
         db.execute(text('TRUNCATE TABLE customer_subscriptions CASCADE'))
@@ -156,6 +166,9 @@ def seed_plans():
         db.commit()
         print("Successfully seeded subscription plans!")
 
+        # Running API workers drop their in-memory plan catalog and cached plan responses
+        asyncio.run(notify_plan_change())
+
     except Exception as e:
         print(f"Error seeding plans: {str(e)}")
         traceback.print_exc()
@@ -1,51 +1,144 @@
 import httpx
+import importlib.util
+import logging
+import time
 from fastapi import HTTPException
 from app.config.settings import settings
+from app.utils.monitoring import (
+    CLERK_API_REQUESTS,
+    CLERK_API_LATENCY,
+    CLERK_HTTP_IN_FLIGHT,
+    CLERK_HTTP_CONNECTIONS_OPENED
+)
 from typing import Optional, Dict, Any
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
+async def _trace(event_name: str, info: dict) -> None:
+    # httpcore's public "trace" request extension
+    if event_name == "connection.connect_tcp.complete":
+        CLERK_HTTP_CONNECTIONS_OPENED.inc()
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that releases the in-flight slot once closed, when its connection is back in the pool"""
+
+    def __init__(self, stream: httpx.AsyncByteStream):
+        self._stream = stream
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                CLERK_HTTP_IN_FLIGHT.dec()
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Pool metrics through public httpx/httpcore APIs only"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions.setdefault("trace", _trace)
+        CLERK_HTTP_IN_FLIGHT.inc()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            CLERK_HTTP_IN_FLIGHT.dec()
+            raise
+        response.stream = _TrackedStream(response.stream)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
 class ClerkClient:
     def __init__(self):
         self.api_key = settings.CLERK_SECRET_KEY
         self.api_url = settings.CLERK_API_URL
-        
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client, created on first use and closed on app shutdown"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                # Limits and HTTP/2 belong to the transport once one is passed in
+                transport=_InstrumentedTransport(httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(
+                        max_connections=settings.CLERK_HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.CLERK_HTTP_MAX_KEEPALIVE,
+                        keepalive_expiry=settings.CLERK_HTTP_KEEPALIVE_EXPIRY,
+                    ),
+                    http2=self._http2_enabled(),
+                )),
+                timeout=httpx.Timeout(
+                    settings.CLERK_HTTP_TIMEOUT,
+                    connect=settings.CLERK_HTTP_CONNECT_TIMEOUT,
+                ),
+            )
+        return self._client
+
+    @staticmethod
+    def _http2_enabled() -> bool:
+        if not settings.CLERK_HTTP2:
+            return False
+        if importlib.util.find_spec("h2") is None:
+            logger.warning("CLERK_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+            return False
+        return True
+
+    async def _request(self, operation: str, method: str, path: str, **kwargs) -> httpx.Response:
+        start_time = time.perf_counter()
+        status_code = "error"
+        try:
+            response = await self._get_client().request(method, path, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            CLERK_API_LATENCY.labels(operation=operation).observe(time.perf_counter() - start_time)
+            CLERK_API_REQUESTS.labels(operation=operation, status_code=status_code).inc()
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
     async def update_user_metadata(self, user_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """Update Clerk user public metadata"""
         print(f"Updating metadata for user {user_id}: {metadata}")
-        url = f"{self.api_url}/users/{user_id}/metadata"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
         payload = {
             "public_metadata": metadata
         }
-        
+
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(url, headers=headers, json=payload)
-                response.raise_for_status()
-                return response.json()
+            response = await self._request(
+                "update_user_metadata", "PATCH", f"/users/{user_id}/metadata", json=payload
+            )
+            response.raise_for_status()
+            return response.json()
         except httpx.HTTPStatusError as e:
             print("------------------ ERROR UPDATING METADATA ------------------")
             raise HTTPException(
                 status_code=e.response.status_code,
                 detail=f"Clerk API error: {str(e)}"
             )
-    
+
     async def get_user_metadata(self, user_id: str) -> Dict[str, Any]:
         """Get Clerk user metadata"""
-        url = f"{self.api_url}/users/{user_id}"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                return data.get("public_metadata", {})
+            response = await self._request("get_user_metadata", "GET", f"/users/{user_id}")
+            response.raise_for_status()
+            data = response.json()
+            return data.get("public_metadata", {})
         except httpx.HTTPStatusError as e:
             raise HTTPException(
                 status_code=e.response.status_code,
@@ -53,4 +146,4 @@ class ClerkClient:
             )
 
 # Singleton instance of the Clerk client
-clerk_client = ClerkClient()
\ No newline at end of file
+clerk_client = ClerkClient()
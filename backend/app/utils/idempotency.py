@@ -0,0 +1,35 @@
+# app/utils/idempotency.py
+import logging
+
+from app.config.settings import settings
+from app.utils.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_EVENT_KEY = "stripe:event:{event_id}"
+
+
+async def is_known_webhook_event(event_id: str) -> bool:
+    """
+    First line of de-duplication for Stripe deliveries: an EXISTS on the marker
+    written once the event is stored. The stripe_webhook_events primary key is
+    the durable check, so a Redis outage fails open.
+    """
+    try:
+        redis = await get_redis()
+        return bool(await redis.exists(WEBHOOK_EVENT_KEY.format(event_id=event_id)))
+    except Exception as e:
+        logger.warning(f"Webhook de-duplication skipped for {event_id}: {str(e)}")
+        return False
+
+
+async def mark_webhook_event(event_id: str) -> None:
+    """
+    Remember an event only after its row is committed, so a crash or a cancelled
+    request can never leave a marker without a stored event. A plain SET, safe to retry.
+    """
+    try:
+        redis = await get_redis()
+        await redis.set(WEBHOOK_EVENT_KEY.format(event_id=event_id), b"1", ex=settings.STRIPE_WEBHOOK_DEDUP_TTL)
+    except Exception as e:
+        logger.warning(f"Could not mark webhook event {event_id}: {str(e)}")
@@ -0,0 +1,134 @@
+# app/utils/jwks.py
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import jwt
+from jwt import PyJWK, PyJWKSet
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSKeyStore:
+    """
+    Async JWKS cache for verifying Clerk tokens.
+    Keys are fetched at startup and refreshed in the background before they expire,
+    so the request path only ever does a dict lookup.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        lifespan: int = 300,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        refresh_margin: float = 0.2,
+        min_refresh_interval: int = 10,
+    ):
+        self.jwks_url = jwks_url
+        self.lifespan = lifespan
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+
+        self._keys: Dict[str, PyJWK] = {}
+        self._fetched_at: float = 0.0
+        self._last_forced_refresh: float = 0.0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at >= self.lifespan
+
+    async def start(self) -> None:
+        """Pre-fetch the key set and schedule background refreshes"""
+        try:
+            await self.refresh()
+            logger.info(f"Loaded {len(self._keys)} signing keys from JWKS")
+        except Exception as e:
+            # Don't block startup, the background loop and unknown-kid path will retry
+            logger.error(f"Initial JWKS fetch failed: {str(e)}")
+
+        if self._background_task is None:
+            self._background_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        for task in (self._background_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        self._background_task = None
+        self._refresh_task = None
+
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def refresh(self) -> None:
+        """Fetch the key set, sharing a single in-flight request between all callers"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+        # Shield so a cancelled request doesn't abort the fetch other callers are waiting on
+        await asyncio.shield(self._refresh_task)
+
+    async def get_signing_key(self, kid: Optional[str]) -> PyJWK:
+        """Return the signing key for a token's kid without waiting on the network when possible"""
+        key = self._keys.get(kid)
+        if key is not None:
+            if self.is_stale:
+                # Serve the known key and let the refresh happen off the request path
+                self._schedule_refresh()
+            return key
+
+        # Unknown kid: the keys may have rotated. Everyone waits on one fetch, and
+        # forced fetches are rate limited so garbage kids can't hammer Clerk.
+        in_flight = self._refresh_task is not None and not self._refresh_task.done()
+        if in_flight or time.monotonic() - self._last_forced_refresh >= self.min_refresh_interval:
+            if not in_flight:
+                self._last_forced_refresh = time.monotonic()
+            await self.refresh()
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise jwt.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return key
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+            self._refresh_task.add_done_callback(self._log_refresh_failure)
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Background JWKS refresh failed: {str(task.exception())}")
+
+    async def _refresh_loop(self) -> None:
+        interval = max(self.lifespan * (1 - self.refresh_margin), 1)
+        while True:
+            # Retry sooner while we have no keys at all
+            await asyncio.sleep(interval if self._keys else min(interval, self.min_refresh_interval))
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Scheduled JWKS refresh failed: {str(e)}")
+
+    async def _fetch(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, headers=self.headers)
+
+        response = await self._client.get(self.jwks_url)
+        response.raise_for_status()
+        jwk_set = PyJWKSet.from_dict(response.json())
+
+        self._keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+        self._fetched_at = time.monotonic()
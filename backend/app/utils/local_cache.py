@@ -0,0 +1,48 @@
+# app/utils/local_cache.py
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU of cached bytes with a per-entry TTL (the L1 in front
+    of Redis). Values are stored as bytes so callers can't mutate a shared entry.
+    """
+
+    def __init__(self, max_size: int = 1024, max_ttl: float = 30.0):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Store a value for min(ttl, max_ttl) seconds, so L1 never outlives L2"""
+        if self.max_size <= 0:
+            return
+        ttl = self.max_ttl if ttl is None else min(ttl, self.max_ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -1,9 +1,7 @@
 import logging
-from logtail import LogtailHandler
 from app.config.settings import settings
 from fastapi import Request, Response, HTTPException
 import time
-import sentry_sdk
 
 def setup_logger(name=__name__):
     """Configure and return a logger with Sentry integration"""
@@ -18,6 +16,8 @@ def setup_logger(name=__name__):
 
     # BetterStack/Logtail handler
     if settings.BETTERSTACK_SOURCE_TOKEN:
+        # Only pay for the logtail import when it's configured
+        from logtail import LogtailHandler
         logtail_handler = LogtailHandler(
             source_token=settings.BETTERSTACK_SOURCE_TOKEN,
             host=settings.BETTERSTACK_INGESTING_HOST
@@ -50,6 +50,7 @@ async def logging_middleware(request: Request, call_next):
         
         # Capture exception in Sentry if configured
         if settings.SENTRY_DSN:
+            import sentry_sdk  # Already imported by init_sentry when a DSN is set
             with sentry_sdk.push_scope() as scope:
                 scope.set_context("request", {
                     "method": request.method,
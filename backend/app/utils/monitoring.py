@@ -9,18 +9,18 @@ from prometheus_client import (
 )
 from fastapi import Request, Response, HTTPException
 import time
-import sentry_sdk
-from sentry_sdk.integrations.asgi import SentryAsgiMiddleware
-from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
-from sentry_sdk.integrations.redis import RedisIntegration
-from sentry_sdk.integrations.logging import LoggingIntegration
 from app.config.settings import settings
 import logging
 
 
 def init_sentry():
-    # Initialize Sentry if DSN is configured
+    # Initialize Sentry if DSN is configured, the SDK is only imported in that case
     if settings.SENTRY_DSN:
+        import sentry_sdk
+        from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+        from sentry_sdk.integrations.redis import RedisIntegration
+        from sentry_sdk.integrations.logging import LoggingIntegration
+
         sentry_sdk.init(
             dsn=settings.SENTRY_DSN,
             integrations=[
@@ -71,6 +71,190 @@ EXCEPTIONS_COUNT = Counter(
     registry=registry
 )
 
+AUTH_TOKEN_CACHE_REQUESTS = Counter(
+    'auth_token_cache_requests_total',
+    'Verified JWT cache lookups',
+    ['result'],
+    registry=registry
+)
+
+CLERK_API_REQUESTS = Counter(
+    'clerk_api_requests_total',
+    'Requests made to the Clerk backend API',
+    ['operation', 'status_code'],
+    registry=registry
+)
+
+CLERK_API_LATENCY = Histogram(
+    'clerk_api_request_duration_seconds',
+    'Clerk backend API latency in seconds',
+    ['operation'],
+    registry=registry,
+    buckets=[0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+)
+
+CLERK_HTTP_IN_FLIGHT = Gauge(
+    'clerk_http_pool_in_flight',
+    'Requests holding a connection of the shared Clerk HTTP pool (until the body is closed)',
+    registry=registry
+)
+
+CLERK_HTTP_CONNECTIONS_OPENED = Counter(
+    'clerk_http_pool_connections_opened_total',
+    'New TCP connections opened by the shared Clerk HTTP pool, compare with requests for the reuse rate',
+    registry=registry
+)
+
+CLERK_SYNC_RESULTS = Counter(
+    'clerk_metadata_sync_total',
+    'Clerk metadata outbox deliveries by result',
+    ['result'],
+    registry=registry
+)
+
+STRIPE_API_LATENCY = Histogram(
+    'stripe_api_request_duration_seconds',
+    'Stripe SDK call latency in seconds, excluding pool wait',
+    ['operation'],
+    registry=registry,
+    buckets=[0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+)
+
+STRIPE_API_ERRORS = Counter(
+    'stripe_api_errors_total',
+    'Stripe SDK calls that raised',
+    ['operation'],
+    registry=registry
+)
+
+STRIPE_POOL_WAIT = Histogram(
+    'stripe_pool_wait_seconds',
+    'Time Stripe calls spend queued for a pool thread',
+    registry=registry,
+    buckets=[0.001, 0.01, 0.05, 0.1, 0.5, 1, 5]
+)
+
+STRIPE_POOL_IN_FLIGHT = Gauge(
+    'stripe_pool_calls_in_flight',
+    'Stripe calls queued or running on the pool',
+    registry=registry
+)
+
+STRIPE_POOL_ACTIVE = Gauge(
+    'stripe_pool_threads_active',
+    'Stripe pool threads currently running a call',
+    registry=registry
+)
+
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    'stripe_webhook_queue_depth',
+    'Stored Stripe events by status',
+    ['status'],
+    registry=registry
+)
+
+WEBHOOK_PROCESSING_LAG = Histogram(
+    'stripe_webhook_processing_lag_seconds',
+    'Time from receiving a Stripe event to finishing it',
+    ['event_type'],
+    registry=registry,
+    buckets=[0.1, 0.5, 1, 5, 15, 60, 300, 1800]
+)
+
+WEBHOOK_EVENTS_PROCESSED = Counter(
+    'stripe_webhook_events_processed_total',
+    'Stripe events handled by the worker pool',
+    ['event_type', 'result'],
+    registry=registry
+)
+
+WEBHOOK_DUPLICATES = Counter(
+    'stripe_webhook_duplicates_total',
+    'Redelivered Stripe events dropped before processing',
+    ['layer'],
+    registry=registry
+)
+
+DB_SESSIONS = Counter(
+    'db_sessions_total',
+    'Database sessions opened per pool and routing reason',
+    ['pool', 'reason'],
+    registry=registry
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_connections_checked_out',
+    'Connections currently checked out of each pool',
+    ['pool'],
+    registry=registry
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    'db_pool_overflow_connections',
+    'Connections open beyond pool_size (bounded by max_overflow)',
+    ['pool'],
+    registry=registry
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent getting a connection from the pool, including connecting',
+    ['pool'],
+    registry=registry,
+    buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30]
+)
+
+DB_POOL_CONNECTIONS_CREATED = Counter(
+    'db_pool_connections_created_total',
+    'New DBAPI connections opened by each pool',
+    ['pool'],
+    registry=registry
+)
+
+DB_POOL_INVALIDATIONS = Counter(
+    'db_pool_invalidations_total',
+    'Pooled connections invalidated (soft: recycled on next checkin)',
+    ['pool', 'kind'],
+    registry=registry
+)
+
+DB_POOL_PRE_PING_FAILURES = Counter(
+    'db_pool_pre_ping_failures_total',
+    'Stale connections detected by pool_pre_ping',
+    ['pool'],
+    registry=registry
+)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request',
+    'SQL statements executed while handling a request',
+    ['method', 'route'],
+    registry=registry,
+    buckets=[0, 1, 2, 3, 5, 8, 13, 21, 50, 100]
+)
+
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds',
+    'Total time spent in SQL statements while handling a request',
+    ['method', 'route'],
+    registry=registry,
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5]
+)
+
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by tier (l1 in-process, l2 Redis), key prefix and result',
+    ['tier', 'prefix', 'result'],
+    registry=registry
+)
+
+CACHE_RECOMPUTATIONS = Counter(
+    'cache_recomputations_total',
+    'Cached responses recomputed, by key prefix and trigger (miss, stale, early)',
+    ['prefix', 'reason'],
+    registry=registry
+)
+
 
 # Middleware to track request metrics
 async def prometheus_middleware(request: Request, call_next):
@@ -0,0 +1,152 @@
+# app/utils/plan_catalog.py
+import asyncio
+import contextlib
+import logging
+import time
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.models.billing import SubscriptionPlan
+from app.utils.redis import publish, subscribe
+
+logger = logging.getLogger(__name__)
+
+PLAN_CATALOG_CHANNEL = "billing:plans:invalidate"
+
+
+@dataclass(frozen=True)
+class CatalogPlan:
+    """Read-only copy of a subscription_plans row, safe to share between requests"""
+    id: int
+    name: str
+    description: Optional[str]
+    price: float
+    features: Tuple[str, ...]
+    stripe_price_id: Optional[str]
+    stripe_product_id: Optional[str]
+    billing_interval: str
+    is_active: bool
+
+    @classmethod
+    def columns(cls):
+        return [getattr(SubscriptionPlan, field.name) for field in fields(cls)]
+
+    @classmethod
+    def from_row(cls, row) -> "CatalogPlan":
+        values = row._asdict()
+        values['features'] = tuple(values['features'] or ())
+        return cls(**values)
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    plans: Tuple[CatalogPlan, ...]
+    by_id: Mapping[int, CatalogPlan]
+    by_price_id: Mapping[str, CatalogPlan]
+    loaded_at: float
+
+
+class PlanCatalog:
+    """
+    All subscription plans held in memory, indexed by id and by stripe_price_id.
+    A reload builds a new immutable snapshot and swaps it in, so readers never
+    see a half-built catalog. Plan changes are announced on a Redis channel and
+    every worker drops its snapshot; max_age bounds staleness if a message is missed.
+    """
+
+    def __init__(self, max_age: int = settings.PLAN_CATALOG_MAX_AGE):
+        self.max_age = max_age
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    def _is_fresh(self) -> bool:
+        snapshot = self._snapshot
+        return snapshot is not None and time.monotonic() - snapshot.loaded_at < self.max_age
+
+    async def load(self, db: AsyncSession) -> _Snapshot:
+        # Plain column rows, the catalog has no use for identity-mapped entities
+        result = await db.execute(select(*CatalogPlan.columns()).order_by(SubscriptionPlan.id))
+        plans = tuple(CatalogPlan.from_row(row) for row in result.all())
+        snapshot = _Snapshot(
+            plans=plans,
+            by_id=MappingProxyType({plan.id: plan for plan in plans}),
+            by_price_id=MappingProxyType({plan.stripe_price_id: plan for plan in plans if plan.stripe_price_id}),
+            loaded_at=time.monotonic(),
+        )
+        self._snapshot = snapshot
+        logger.info(f"Plan catalog loaded with {len(plans)} plans")
+        return snapshot
+
+    async def snapshot(self, db: AsyncSession) -> _Snapshot:
+        if self._is_fresh():
+            return self._snapshot
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if self._is_fresh():
+                return self._snapshot
+            return await self.load(db)
+
+    async def all(self, db: AsyncSession) -> Tuple[CatalogPlan, ...]:
+        return (await self.snapshot(db)).plans
+
+    async def get(self, db: AsyncSession, plan_id: int) -> Optional[CatalogPlan]:
+        return (await self.snapshot(db)).by_id.get(plan_id)
+
+    async def get_by_price_id(self, db: AsyncSession, stripe_price_id: str) -> Optional[CatalogPlan]:
+        return (await self.snapshot(db)).by_price_id.get(stripe_price_id)
+
+    def invalidate(self) -> None:
+        """Drop the local snapshot, the next lookup reloads it"""
+        self._snapshot = None
+
+    async def publish_invalidation(self) -> None:
+        """Tell every worker (this one included) that plans changed"""
+        self.invalidate()
+        try:
+            await publish(PLAN_CATALOG_CHANNEL)
+        except Exception as e:
+            logger.warning(f"Could not publish plan catalog invalidation: {str(e)}")
+
+    async def start(self, db: AsyncSession) -> None:
+        await self.load(db)
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+
+    async def _listen(self) -> None:
+        reconnecting = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = await subscribe(PLAN_CATALOG_CHANNEL)
+                if reconnecting:
+                    # Anything published while we were disconnected is lost
+                    self.invalidate()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Plan catalog subscription lost, retrying: {str(e)}")
+                reconnecting = True
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    with contextlib.suppress(Exception):
+                        await pubsub.close()
+
+
+plan_catalog = PlanCatalog()
@@ -1,85 +1,541 @@
 from redis import asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import EqualJitterBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 from app.config.settings import settings
-from typing import Optional, Any
+from app.utils.local_cache import LocalCache
+from app.utils.monitoring import CACHE_REQUESTS, CACHE_RECOMPUTATIONS
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Iterable, Optional, Any
 from functools import wraps
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import contextlib
 import pickle
 import json
 import inspect
+import logging
+import math
+import random
+import string
+import struct
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
 
 redis_client = None
+pubsub_client = None
+
+def _create_client(socket_timeout: Optional[float]) -> aioredis.Redis:
+    # Transient errors are retried with jittered exponential backoff, so a brief
+    # failover doesn't turn into a burst of synchronized reconnects
+    retry = Retry(
+        EqualJitterBackoff(cap=settings.REDIS_RETRY_BACKOFF_CAP, base=settings.REDIS_RETRY_BACKOFF_BASE),
+        settings.REDIS_RETRY_ATTEMPTS
+    )
+    pool = aioredis.BlockingConnectionPool(
+        connection_class=aioredis.SSLConnection,
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        password=settings.REDIS_PASSWORD,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        retry=retry,
+        retry_on_error=[RedisConnectionError, RedisTimeoutError],
+        decode_responses=False  # Important for caching binary data
+    )
+    return aioredis.Redis(connection_pool=pool)
 
 async def get_redis() -> aioredis.Redis:
     global redis_client
     if redis_client is None:
-        redis_client = aioredis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            password=settings.REDIS_PASSWORD,
-            ssl=True,
-            decode_responses=False  # Important for caching binary data
-        )
+        redis_client = _create_client(settings.REDIS_SOCKET_TIMEOUT)
     return redis_client
 
+async def _get_pubsub_client() -> aioredis.Redis:
+    # Subscribers block on reads indefinitely, a socket timeout would keep dropping them
+    global pubsub_client
+    if pubsub_client is None:
+        pubsub_client = _create_client(None)
+    return pubsub_client
+
 async def close_redis():
-    global redis_client
-    if redis_client:
-        await redis_client.close()
-        redis_client = None
+    global redis_client, pubsub_client
+    for client in (redis_client, pubsub_client):
+        if client:
+            await client.close()
+            # The pool was passed in, so the client doesn't disconnect it on close
+            await client.connection_pool.disconnect()
+    redis_client = pubsub_client = None
+
+def _serialize(value: Any) -> bytes:
+    if isinstance(value, (str, int, float, bool)):
+        return json.dumps(value).encode('utf-8')
+    return pickle.dumps(value)
+
+def _deserialize(data: bytes) -> Any:
+    try:
+        return pickle.loads(data)
+    except:
+        try:
+            return json.loads(data.decode('utf-8'))
+        except:
+            return data
 
 # Cache Operations
 async def cache_get(key: str) -> Optional[Any]:
     """Get cached data with automatic deserialization"""
-    redis = await get_redis()
-    data = await redis.get(key)
+    data = await get_bytes(key)
     if data:
-        try:
-            return pickle.loads(data)
-        except:
-            try:
-                return json.loads(data.decode('utf-8'))
-            except:
-                return data
+        return _deserialize(data)
     return None
 
 async def cache_set(key: str, value: Any, ttl: int = 3600) -> bool:
     """Set cached data with automatic serialization"""
-    redis = await get_redis()
     try:
-        if isinstance(value, (str, int, float, bool)):
-            serialized = json.dumps(value).encode('utf-8')
-        else:
-            serialized = pickle.dumps(value)
-        return await redis.set(key, serialized, ex=ttl)
+        return await set_bytes(key, _serialize(value), ttl)
     except Exception as e:
         logger.error(f"Cache set failed for key {key}: {str(e)}")
         return False
 
 async def cache_delete(key: str) -> bool:
     """Delete cached data"""
+    return await delete_keys(key) > 0
+
+async def cache_get_many(keys: Iterable[str]) -> Dict[str, Any]:
+    """Get several cached values in one round trip, missing keys are left out"""
+    return {
+        key: _deserialize(data)
+        for key, data in (await get_many_bytes(keys)).items()
+        if data
+    }
+
+async def cache_set_many(mapping: Dict[str, Any], ttl: int = 3600) -> bool:
+    """Set several values with the same TTL in one round trip"""
+    try:
+        return await set_many_bytes({key: _serialize(value) for key, value in mapping.items()}, ttl)
+    except Exception as e:
+        logger.error(f"Cache set failed for keys {list(mapping)}: {str(e)}")
+        return False
+
+async def cache_delete_many(keys: Iterable[str]) -> int:
+    """Delete several keys in one round trip, returns how many existed"""
+    return await delete_keys(*keys)
+
+async def set_if_absent(key: str, ttl: int, value: bytes = b"1") -> bool:
+    """Atomically set a key only if it doesn't exist yet (SET NX EX)"""
+    redis = await get_redis()
+    return bool(await redis.set(key, value, ex=ttl, nx=True))
+
+# Pub/Sub
+async def publish(channel: str, message: str = "") -> int:
+    """Publish a message, returns the number of subscribers that received it"""
+    redis = await get_redis()
+    return await redis.publish(channel, message)
+
+async def subscribe(*channels: str):
+    """Return a PubSub subscribed to the given channels, the caller must close it"""
+    redis = await _get_pubsub_client()
+    pubsub = redis.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(*channels)
+    return pubsub
+
+# Two-tier cache: a per-worker in-process L1 in front of Redis (L2).
+# Writes and deletes are announced on a channel so other workers drop their L1 copy;
+# CACHE_L1_MAX_TTL bounds staleness if an announcement is missed.
+local_cache = LocalCache(max_size=settings.CACHE_L1_MAX_SIZE, max_ttl=settings.CACHE_L1_MAX_TTL)
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+_INSTANCE_ID = uuid.uuid4().hex
+
+def _prefix(key: str) -> str:
+    return key.split(":", 1)[0]
+
+def _invalidation_message(keys) -> str:
+    return json.dumps({"from": _INSTANCE_ID, "keys": list(keys)})
+
+async def get_bytes(key: str, prefix: Optional[str] = None) -> Optional[bytes]:
+    """Raw cached bytes, from the L1 if possible; an L2 hit is copied into the L1 for its remaining TTL"""
+    prefix = prefix or _prefix(key)
+    value = local_cache.get(key)
+    if value is not None:
+        CACHE_REQUESTS.labels(tier="l1", prefix=prefix, result="hit").inc()
+        return value
+    CACHE_REQUESTS.labels(tier="l1", prefix=prefix, result="miss").inc()
+
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        value, pttl = await pipe.get(key).pttl(key).execute()
+    CACHE_REQUESTS.labels(tier="l2", prefix=prefix, result="hit" if value is not None else "miss").inc()
+    if value is not None:
+        # -1: no expiry in Redis, the L1 cap applies
+        local_cache.set(key, value, pttl / 1000 if pttl > 0 else None)
+    return value
+
+async def get_many_bytes(keys: Iterable[str]) -> Dict[str, Optional[bytes]]:
+    """get_bytes for several keys: L1 first, then one MGET (plus PTTLs) for the rest"""
+    keys = list(dict.fromkeys(keys))
+    values = {}
+    missing = []
+    for key in keys:
+        value = local_cache.get(key)
+        CACHE_REQUESTS.labels(tier="l1", prefix=_prefix(key), result="hit" if value is not None else "miss").inc()
+        if value is not None:
+            values[key] = value
+        else:
+            missing.append(key)
+    if not missing:
+        return values
+
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.mget(missing)
+        for key in missing:
+            pipe.pttl(key)
+        found, *pttls = await pipe.execute()
+    for key, value, pttl in zip(missing, found, pttls):
+        CACHE_REQUESTS.labels(tier="l2", prefix=_prefix(key), result="hit" if value is not None else "miss").inc()
+        values[key] = value
+        if value is not None:
+            local_cache.set(key, value, pttl / 1000 if pttl > 0 else None)
+    return values
+
+async def set_many_bytes(mapping: Dict[str, bytes], ttl: int) -> bool:
+    """set_bytes for several keys, in one round trip and one invalidation message"""
+    if not mapping:
+        return True
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ttl)
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, _invalidation_message(mapping))
+        results = await pipe.execute()
+    for key, value in mapping.items():
+        local_cache.set(key, value, ttl)
+    return all(results[:-1])
+
+# Tags group cache keys so they can be dropped together, e.g. every entry of a user on a
+# billing event. Each tag is a Redis set of keys that lives as long as its longest entry.
+_TAG_KEY = """
+redis.call('sadd', KEYS[1], ARGV[1])
+if redis.call('ttl', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('expire', KEYS[1], ARGV[2])
+end
+"""
+
+def _tag_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+async def set_bytes(key: str, value: bytes, ttl: int, tags: Iterable[str] = ()) -> bool:
+    """Write both tiers and tell other workers to drop their L1 copy (one round trip)"""
     redis = await get_redis()
-    return await redis.delete(key) > 0
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.set(key, value, ex=ttl)
+        for tag in tags:
+            pipe.eval(_TAG_KEY, 1, _tag_key(tag), key, ttl)
+        pipe.publish(CACHE_INVALIDATION_CHANNEL, _invalidation_message([key]))
+        ok = (await pipe.execute())[0]
+    local_cache.set(key, value, ttl)
+    return bool(ok)
+
+async def invalidate_tags(*tags: str) -> int:
+    """
+    Delete every key recorded under the given tags, on both tiers and every worker.
+    Returns how many cached keys the tags held; Redis errors are logged, the
+    entries then expire on their own.
+    """
+    if not tags:
+        return 0
+    try:
+        redis = await get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.smembers(_tag_key(tag))
+            members = await pipe.execute()
+        keys = {key.decode() for keys in members for key in keys}
+        await delete_keys(*keys, *(_tag_key(tag) for tag in tags))
+        return len(keys)
+    except Exception as e:
+        logger.error(f"Cache invalidation failed for tags {tags}: {str(e)}")
+        return 0
+
+async def delete_keys(*keys: str) -> int:
+    """Delete from both tiers on every worker, returns how many keys Redis removed"""
+    if not keys:
+        return 0
+    for key in keys:
+        local_cache.delete(key)
+    redis = await get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        deleted, _ = await pipe.delete(*keys).publish(
+            CACHE_INVALIDATION_CHANNEL, _invalidation_message(keys)
+        ).execute()
+    return deleted
+
+class CacheInvalidationListener:
+    """Drops L1 entries that another worker rewrote or deleted"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None and local_cache.max_size > 0:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _listen(self) -> None:
+        reconnecting = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = await subscribe(CACHE_INVALIDATION_CHANNEL)
+                if reconnecting:
+                    # Announcements sent while disconnected are lost
+                    local_cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("from") == _INSTANCE_ID:
+                        continue
+                    for key in payload.get("keys", ()):
+                        local_cache.delete(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscription lost, retrying: {str(e)}")
+                reconnecting = True
+                await asyncio.sleep(5)
+            finally:
+                if pubsub is not None:
+                    with contextlib.suppress(Exception):
+                        await pubsub.close()
+
+cache_invalidation_listener = CacheInvalidationListener()
 
 # Cache Decorator
-def cached(ttl: int = 300, key_prefix: str = "cache"):
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+_ANY_ADAPTER = TypeAdapter(Any)
+
+def _user_id(bound: dict) -> Optional[str]:
+    """The authenticated Clerk user, from a `user_data` dependency (get_current_user)"""
+    user_data = bound.get("user_data")
+    return user_data.get("sub") if isinstance(user_data, dict) else None
+
+def build_cache_key(key_prefix: str, fields: set, bound: dict, exact: bool = False) -> str:
+    """
+    Fill the key template from the bound arguments and append any other scalar
+    argument, so two calls only share a key when they'd return the same response.
+    With exact the template is only filled (used for tags).
+    """
+    values = {name: value for name, value in bound.items() if isinstance(value, _SCALAR_TYPES)}
+    if "user_id" in fields:
+        values["user_id"] = _user_id(bound)
+    key = key_prefix.format(**values)
+    if exact:
+        return key
+    extra = sorted((name, value) for name, value in values.items() if name not in fields)
+    if extra:
+        key += ":" + "&".join(f"{name}={value}" for name, value in extra)
+    return key
+
+# Cached responses are stored as an envelope: fresh_until (epoch) and delta (seconds the
+# last recomputation took) ahead of the body. Redis keeps them for ttl + stale_ttl.
+_ENVELOPE = struct.Struct("!dd")
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_inflight: dict = {}
+
+def pack_envelope(body: bytes, fresh_until: float, delta: float) -> bytes:
+    return _ENVELOPE.pack(fresh_until, delta) + body
+
+def unpack_envelope(data: bytes):
+    fresh_until, delta = _ENVELOPE.unpack_from(data)
+    return fresh_until, delta, data[_ENVELOPE.size:]
+
+def should_refresh_early(fresh_until: float, delta: float, beta: float, now: float) -> bool:
+    """XFetch: refresh ahead of expiry with a probability that grows as expiry nears"""
+    if beta <= 0 or delta <= 0:
+        return False
+    return now - delta * beta * math.log(1.0 - random.random()) >= fresh_until
+
+async def _release_lock(lock_key: str, token: str) -> None:
+    try:
+        redis = await get_redis()
+        await redis.eval(_RELEASE_LOCK, 1, lock_key, token)
+    except Exception as e:
+        logger.warning(f"Could not release cache lock {lock_key}: {str(e)}")
+
+async def _wait_for_value(cache_key: str) -> Optional[bytes]:
+    """Poll Redis while another process holds the recompute lock"""
+    redis = await get_redis()
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        data = await redis.get(cache_key)
+        if data is not None:
+            return data
+    return None
+
+def single_flight(key: str, factory):
+    """Run factory() once per key in this process; concurrent callers share the same task"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return task
+
+def cached(
+    ttl: int = 300,
+    key_prefix: str = "cache",
+    response_model: Any = None,
+    stale_ttl: int = 0,
+    beta: float = 0.0,
+    tags: Iterable[str] = (),
+):
+    """
+    Cache a GET route's serialized JSON response in Redis.
+
+    key_prefix is a template filled from the route's arguments, e.g.
+    "billing:plan:{plan_id}"; "{user_id}" is the `sub` of the `user_data`
+    dependency. When response_model is given the result is validated and
+    dumped through it (like FastAPI would), and the cached bytes are returned
+    as-is on a hit. Works for sync routes too, which run in the threadpool.
+
+    Stampede protection: concurrent misses share one recomputation per process,
+    and a short Redis lock makes other processes wait for it. With stale_ttl an
+    expired response is served for that long while it is refreshed in the
+    background; beta > 0 also refreshes early on the XFetch schedule (1.0 is a
+    sensible default).
+
+    tags are templates like key_prefix ("user:{user_id}", "plans"); invalidate_tags()
+    drops every entry recorded under a tag.
+    """
     def decorator(func):
         is_async = inspect.iscoroutinefunction(func)
+        signature = inspect.signature(func)
+        fields = {name for _, name, _, _ in string.Formatter().parse(key_prefix) if name}
+        tags_fields = {name for tag in tags for _, name, _, _ in string.Formatter().parse(tag) if name}
+        for name in fields | tags_fields:
+            if name == "user_id" and "user_data" in signature.parameters:
+                continue
+            if name not in signature.parameters:
+                raise ValueError(f"Cache key field {{{name}}} is not a parameter of {func.__name__}")
+        adapter = TypeAdapter(response_model) if response_model is not None else _ANY_ADAPTER
+
+        async def call(*args, **kwargs):
+            if is_async:
+                return await func(*args, **kwargs)
+            return await run_in_threadpool(func, *args, **kwargs)
+
+        def serialize(result) -> bytes:
+            if response_model is not None:
+                return adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+            return adapter.dump_json(jsonable_encoder(result))
+
+        async def compute(cache_key: str, kwargs: dict) -> bytes:
+            # Shared by every waiter and possibly outliving the request, so the loader gets
+            # its own session instead of the request-scoped one (which teardown closes).
+            # It is bound to the same engine the dependency picked (primary or replica).
+            async with contextlib.AsyncExitStack() as stack:
+                own_kwargs = {
+                    name: await stack.enter_async_context(
+                        AsyncSession(bind=value.bind, expire_on_commit=False, autoflush=False)
+                    ) if isinstance(value, AsyncSession) else value
+                    for name, value in kwargs.items()
+                }
+                started = time.perf_counter()
+                body = serialize(await call(**own_kwargs))
+                delta = time.perf_counter() - started
+            try:
+                await set_bytes(
+                    cache_key,
+                    pack_envelope(body, time.time() + ttl, delta),
+                    ttl + stale_ttl,
+                    tags=[build_cache_key(tag, tags_fields, kwargs, exact=True) for tag in tags]
+                )
+            except Exception as e:
+                logger.warning(f"Cache set failed for key {cache_key}: {str(e)}")
+            return body
+
+        async def recompute_on_miss(cache_key: str, kwargs: dict) -> bytes:
+            CACHE_RECOMPUTATIONS.labels(prefix=key_prefix, reason="miss").inc()
+            lock_key, token = f"lock:{cache_key}", uuid.uuid4().hex
+            try:
+                locked = await set_if_absent(lock_key, settings.CACHE_LOCK_TTL, token.encode())
+            except Exception:
+                locked = True  # Redis is down, nothing to coordinate with
+            if not locked:
+                try:
+                    data = await _wait_for_value(cache_key)
+                except Exception:
+                    data = None
+                if data is not None:
+                    return unpack_envelope(data)[2]
+                # The holder is slow or died, compute rather than fail the request
+            try:
+                return await compute(cache_key, kwargs)
+            finally:
+                if locked:
+                    await _release_lock(lock_key, token)
+
+        async def refresh_in_background(cache_key: str, kwargs: dict, reason: str) -> None:
+            lock_key, token = f"lock:{cache_key}", uuid.uuid4().hex
+            try:
+                if not await set_if_absent(lock_key, settings.CACHE_LOCK_TTL, token.encode()):
+                    return  # Another process is already refreshing
+                CACHE_RECOMPUTATIONS.labels(prefix=key_prefix, reason=reason).inc()
+                await compute(cache_key, kwargs)
+            except Exception as e:
+                logger.warning(f"Background refresh failed for key {cache_key}: {str(e)}")
+            finally:
+                await _release_lock(lock_key, token)
 
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
-            if 'request' in kwargs and kwargs['request'].method not in ('GET', 'HEAD'):
-                return await func(*args, **kwargs) if is_async else func(*args, **kwargs)
+            request = kwargs.get('request')
+            if request is not None and request.method not in ('GET', 'HEAD'):
+                return await call(*args, **kwargs)
 
-            cache_key = f"{key_prefix}:{func.__module__}:{func.__name__}"
-            if 'request' in kwargs:
-                cache_key += f":path:{kwargs['request'].url.path}"
+            bound = signature.bind_partial(*args, **kwargs).arguments
+            cache_key = build_cache_key(key_prefix, fields, bound)
+
+            try:
+                data = await get_bytes(cache_key, prefix=key_prefix)
+            except Exception as e:
+                logger.warning(f"Cache get failed for key {cache_key}: {str(e)}")
+                data = None
 
-            cached_result = await cache_get(cache_key)
-            if cached_result is not None:
-                return cached_result
+            if data is not None:
+                fresh_until, delta, body = unpack_envelope(data)
+                now = time.time()
+                if now >= fresh_until:
+                    single_flight(f"refresh:{cache_key}", lambda: refresh_in_background(cache_key, dict(bound), "stale"))
+                    return Response(content=body, media_type="application/json", headers={"X-Cache": "STALE"})
+                if should_refresh_early(fresh_until, delta, beta, now):
+                    single_flight(f"refresh:{cache_key}", lambda: refresh_in_background(cache_key, dict(bound), "early"))
+                return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
 
-            result = await func(*args, **kwargs) if is_async else func(*args, **kwargs)
-            await cache_set(cache_key, result, ttl)
-            return result
+            # Shielded so a client disconnect doesn't cancel the computation others are waiting on
+            body = await asyncio.shield(single_flight(cache_key, lambda: recompute_on_miss(cache_key, dict(bound))))
+            return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
 
         return async_wrapper
     return decorator
@@ -0,0 +1,68 @@
+# app/utils/token_cache.py
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.monitoring import AUTH_TOKEN_CACHE_REQUESTS
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already verified JWT claims, keyed by a SHA-256 digest of the token.
+    Entries live until the token's exp (optionally capped by max_ttl) so a repeated
+    session token costs a hash lookup instead of an RSA signature check.
+    """
+
+    def __init__(self, max_size: int = 1024, max_ttl: Optional[int] = None):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return cached claims for a token, or None if unknown or expired"""
+        key = self._digest(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, claims = entry
+            if time.time() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                AUTH_TOKEN_CACHE_REQUESTS.labels(result="hit").inc()
+                return dict(claims)
+            del self._entries[key]
+
+        self.misses += 1
+        AUTH_TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        """Cache verified claims until the token expires. Tokens without exp are not cached."""
+        exp = claims.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return
+
+        now = time.time()
+        expires_at = float(exp)
+        if self.max_ttl is not None:
+            expires_at = min(expires_at, now + self.max_ttl)
+        if expires_at <= now:
+            return
+
+        key = self._digest(token)
+        self._entries[key] = (expires_at, dict(claims))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
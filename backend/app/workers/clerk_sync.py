@@ -0,0 +1,166 @@
+# app/workers/clerk_sync.py
+import asyncio
+import contextlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.sql import func
+
+from app.config.settings import settings
+from app.db.session import async_get_db
+from app.models.billing import ClerkMetadataOutbox, CustomerSubscription
+from app.utils.clerk import clerk_client
+from app.utils.monitoring import CLERK_SYNC_RESULTS
+
+logger = logging.getLogger(__name__)
+
+
+class ClerkMetadataSyncWorker:
+    """
+    Drains the Clerk metadata outbox in the background.
+    Rows are leased rather than locked, so webhook handlers can keep enqueueing
+    while a delivery is in flight; a delivery only marks a row as synced if its
+    fingerprint is still the one that was sent.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = settings.CLERK_SYNC_POLL_INTERVAL,
+        batch_size: int = settings.CLERK_SYNC_BATCH_SIZE,
+        lease_seconds: int = settings.CLERK_SYNC_LEASE_SECONDS,
+        max_backoff: int = settings.CLERK_SYNC_MAX_BACKOFF,
+    ):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_backoff = max_backoff
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        """Wake the worker up instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error("Clerk metadata sync batch failed", exc_info=True)
+                processed = 0
+
+            if processed < self.batch_size:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                self._wakeup.clear()
+
+    async def process_batch(self) -> int:
+        """Deliver one batch of pending rows, returns how many were claimed"""
+        rows = await self._claim()
+        if not rows:
+            return 0
+
+        results = await asyncio.gather(
+            *(self._deliver(row.user_id, row.metadata_payload) for row in rows),
+            return_exceptions=True,
+        )
+
+        async with async_get_db() as db:
+            for row, result in zip(rows, results):
+                if isinstance(result, Exception):
+                    await self._record_failure(db, row, result)
+                else:
+                    await self._record_success(db, row)
+        return len(rows)
+
+    async def _claim(self):
+        pending = ClerkMetadataOutbox.fingerprint.is_distinct_from(ClerkMetadataOutbox.synced_fingerprint)
+        claimable = (
+            select(ClerkMetadataOutbox.user_id)
+            .where(pending, ClerkMetadataOutbox.available_at <= func.now())
+            .order_by(ClerkMetadataOutbox.available_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(ClerkMetadataOutbox)
+            .where(ClerkMetadataOutbox.user_id.in_(claimable))
+            .values(available_at=func.now() + timedelta(seconds=self.lease_seconds))
+            .returning(
+                ClerkMetadataOutbox.user_id,
+                ClerkMetadataOutbox.metadata_payload,
+                ClerkMetadataOutbox.fingerprint,
+                ClerkMetadataOutbox.attempts,
+            )
+        )
+        async with async_get_db() as db:
+            result = await db.execute(stmt)
+            return result.all()
+
+    async def _deliver(self, user_id: str, metadata: dict) -> None:
+        payload = {**metadata, "last_checked": datetime.now(timezone.utc).isoformat()}
+        await clerk_client.update_user_metadata(user_id, payload)
+
+    async def _record_success(self, db, row) -> None:
+        await db.execute(
+            update(ClerkMetadataOutbox)
+            .where(
+                ClerkMetadataOutbox.user_id == row.user_id,
+                ClerkMetadataOutbox.fingerprint == row.fingerprint,
+            )
+            .values(synced_fingerprint=row.fingerprint, attempts=0, last_error=None)
+        )
+        await db.execute(
+            update(CustomerSubscription)
+            .where(CustomerSubscription.user_id == row.user_id)
+            .values(last_metadata_sync=func.now())
+        )
+        CLERK_SYNC_RESULTS.labels(result="synced").inc()
+
+    async def _record_failure(self, db, row, error: Exception) -> None:
+        values = {"attempts": row.attempts + 1, "last_error": str(error)[:500]}
+
+        # Client errors other than rate limiting won't succeed on retry (e.g. deleted user)
+        status_code = getattr(error, "status_code", None)
+        if isinstance(error, HTTPException) and 400 <= status_code < 500 and status_code != 429:
+            logger.error(f"Dropping Clerk metadata update for {row.user_id}: {str(error)}")
+            values["synced_fingerprint"] = row.fingerprint
+            CLERK_SYNC_RESULTS.labels(result="dropped").inc()
+        else:
+            backoff = min(2 ** row.attempts, self.max_backoff)
+            values["available_at"] = func.now() + timedelta(seconds=backoff)
+            logger.warning(
+                f"Clerk metadata sync failed for {row.user_id} (attempt {row.attempts + 1}), "
+                f"retrying in {backoff}s: {str(error)}"
+            )
+            CLERK_SYNC_RESULTS.labels(result="failed").inc()
+
+        # A newer enqueue has already rescheduled the row, leave it alone
+        await db.execute(
+            update(ClerkMetadataOutbox)
+            .where(
+                ClerkMetadataOutbox.user_id == row.user_id,
+                ClerkMetadataOutbox.fingerprint == row.fingerprint,
+            )
+            .values(**values)
+        )
+
+
+clerk_sync_worker = ClerkMetadataSyncWorker()
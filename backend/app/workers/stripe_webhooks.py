@@ -0,0 +1,226 @@
+# app/workers/stripe_webhooks.py
+import asyncio
+import contextlib
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import stripe
+from sqlalchemy import select, update, or_, and_, exists
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import func
+
+from app.api.v1.billing.handlers import WEBHOOK_HANDLERS, StaleEventError
+from app.config.settings import settings
+from app.db.session import async_get_db, get_async_sessionmaker
+from app.models.billing import StripeWebhookEvent, WebhookEventStatus
+from app.utils.monitoring import WEBHOOK_QUEUE_DEPTH, WEBHOOK_PROCESSING_LAG, WEBHOOK_EVENTS_PROCESSED
+
+logger = logging.getLogger(__name__)
+
+
+class StripeWebhookWorkerPool:
+    """
+    Processes stored Stripe events in the background.
+    A dispatcher leases due events from Postgres (SKIP LOCKED, so several app
+    instances can share the table) and hands them to a pool of async workers.
+    Failed events are retried with backoff and end up as DEAD after max_attempts.
+
+    Events are partitioned by partition_key (the subscription ID): only the oldest
+    unfinished event of a partition can be claimed, and a partition always maps to
+    the same worker, so each subscription is processed in order while different
+    subscriptions run in parallel.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.STRIPE_WEBHOOK_WORKERS,
+        batch_size: int = settings.STRIPE_WEBHOOK_BATCH_SIZE,
+        poll_interval: float = settings.STRIPE_WEBHOOK_POLL_INTERVAL,
+        max_attempts: int = settings.STRIPE_WEBHOOK_MAX_ATTEMPTS,
+        lease_seconds: int = settings.STRIPE_WEBHOOK_LEASE_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(concurrency)]
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self) -> None:
+        """Wake the dispatcher up instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        for queue in self._queues:
+            self._tasks.append(asyncio.create_task(self._work(queue)))
+
+    async def stop(self) -> None:
+        # Leased events that were not finished become claimable again once the lease expires
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def _dispatch(self) -> None:
+        while True:
+            try:
+                events = await self._claim()
+                for event in events:
+                    await self._queue_for(event.partition_key).put(event)
+                await self._report_depth()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error("Webhook dispatcher failed to claim events", exc_info=True)
+                events = []
+
+            if len(events) < self.batch_size:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                self._wakeup.clear()
+
+    def _queue_for(self, partition_key: str) -> asyncio.Queue:
+        return self._queues[zlib.crc32(partition_key.encode("utf-8")) % len(self._queues)]
+
+    async def _claim(self):
+        now = func.now()
+        unfinished = [WebhookEventStatus.PENDING, WebhookEventStatus.PROCESSING]
+        earlier = aliased(StripeWebhookEvent)
+        # Head of line per partition: nothing older from the same subscription is still unfinished
+        is_partition_head = ~exists().where(
+            earlier.partition_key == StripeWebhookEvent.partition_key,
+            earlier.status.in_(unfinished),
+            or_(
+                earlier.event_created < StripeWebhookEvent.event_created,
+                and_(
+                    earlier.event_created == StripeWebhookEvent.event_created,
+                    earlier.received_at < StripeWebhookEvent.received_at,
+                ),
+            ),
+        )
+        due = or_(
+            and_(StripeWebhookEvent.status == WebhookEventStatus.PENDING, StripeWebhookEvent.available_at <= now),
+            # Lease expired, the worker holding it died
+            and_(StripeWebhookEvent.status == WebhookEventStatus.PROCESSING, StripeWebhookEvent.available_at <= now),
+        )
+        claimable = (
+            select(StripeWebhookEvent.id)
+            .where(due, is_partition_head)
+            .order_by(StripeWebhookEvent.event_created, StripeWebhookEvent.received_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(StripeWebhookEvent)
+            .where(StripeWebhookEvent.id.in_(claimable))
+            .values(
+                status=WebhookEventStatus.PROCESSING,
+                attempts=StripeWebhookEvent.attempts + 1,
+                available_at=now + timedelta(seconds=self.lease_seconds),
+            )
+            .returning(
+                StripeWebhookEvent.id,
+                StripeWebhookEvent.type,
+                StripeWebhookEvent.payload,
+                StripeWebhookEvent.partition_key,
+                StripeWebhookEvent.event_created,
+                StripeWebhookEvent.attempts,
+                StripeWebhookEvent.received_at,
+            )
+        )
+        async with async_get_db() as db:
+            result = await db.execute(stmt)
+            return sorted(result.all(), key=lambda event: (event.event_created, event.received_at))
+
+    async def _report_depth(self) -> None:
+        async with async_get_db() as db:
+            result = await db.execute(
+                select(StripeWebhookEvent.status, func.count())
+                .where(StripeWebhookEvent.status != WebhookEventStatus.PROCESSED)
+                .group_by(StripeWebhookEvent.status)
+            )
+            counts = dict(result.all())
+        for status in (WebhookEventStatus.PENDING, WebhookEventStatus.PROCESSING, WebhookEventStatus.DEAD):
+            WEBHOOK_QUEUE_DEPTH.labels(status=status.value).set(counts.get(status, 0))
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            event = await queue.get()
+            try:
+                await self.process(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error(f"Unexpected error processing webhook event {event.id}", exc_info=True)
+            finally:
+                queue.task_done()
+
+    async def process(self, event) -> None:
+        handler = WEBHOOK_HANDLERS.get(event.type)
+        error: Optional[Exception] = None
+        result = "processed"
+        if handler is not None:
+            stripe_event = stripe.Event.construct_from(event.payload, stripe.api_key)
+            async with get_async_sessionmaker()() as db:
+                try:
+                    await handler(stripe_event.data.object, db, event.event_created)
+                    await db.commit()
+                except StaleEventError as e:
+                    await db.rollback()
+                    logger.info(f"Rejected stale webhook event {event.id}: {str(e)}")
+                    result = "stale"
+                except Exception as e:
+                    await db.rollback()
+                    error = e
+
+        if error is None:
+            await self._finish(event, result)
+        else:
+            await self._fail(event, error)
+
+    async def _finish(self, event, result: str = "processed") -> None:
+        async with async_get_db() as db:
+            await db.execute(
+                update(StripeWebhookEvent)
+                .where(StripeWebhookEvent.id == event.id)
+                .values(status=WebhookEventStatus.PROCESSED, processed_at=func.now(), last_error=None)
+            )
+        WEBHOOK_PROCESSING_LAG.labels(event_type=event.type).observe(
+            (datetime.now(timezone.utc) - event.received_at).total_seconds()
+        )
+        WEBHOOK_EVENTS_PROCESSED.labels(event_type=event.type, result=result).inc()
+
+    async def _fail(self, event, error: Exception) -> None:
+        values = {"last_error": str(error)[:1000]}
+        if event.attempts >= self.max_attempts:
+            values["status"] = WebhookEventStatus.DEAD
+            logger.error(f"Webhook event {event.id} ({event.type}) moved to dead letters: {str(error)}")
+            result = "dead"
+        else:
+            backoff = min(2 ** event.attempts, 600)
+            values["status"] = WebhookEventStatus.PENDING
+            values["available_at"] = func.now() + timedelta(seconds=backoff)
+            logger.warning(
+                f"Webhook event {event.id} ({event.type}) failed on attempt {event.attempts}, "
+                f"retrying in {backoff}s: {str(error)}"
+            )
+            result = "retry"
+
+        async with async_get_db() as db:
+            await db.execute(
+                update(StripeWebhookEvent).where(StripeWebhookEvent.id == event.id).values(**values)
+            )
+        WEBHOOK_EVENTS_PROCESSED.labels(event_type=event.type, result=result).inc()
+
+
+webhook_worker_pool = StripeWebhookWorkerPool()
@@ -0,0 +1,139 @@
+"""Baseline billing schema
+
+Matches what Base.metadata.create_all used to build at startup. Databases that
+were bootstrapped that way are adopted: existing tables are left alone and only
+columns added since are created.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+subscription_status = sa.Enum(
+    'INCOMPLETE', 'INCOMPLETE_EXPIRED', 'TRIALING', 'ACTIVE', 'PAST_DUE', 'CANCELED', 'UNPAID',
+    name='subscriptionstatus',
+)
+scheduled_change_type = sa.Enum('CANCEL', 'UPGRADE', 'DOWNGRADE', name='scheduledchangetype')
+webhook_event_status = sa.Enum('PENDING', 'PROCESSING', 'PROCESSED', 'DEAD', name='webhookeventstatus')
+
+
+def _has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _has_column(table: str, column: str) -> bool:
+    return any(c['name'] == column for c in sa.inspect(op.get_bind()).get_columns(table))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for enum in (subscription_status, scheduled_change_type, webhook_event_status):
+        enum.create(bind, checkfirst=True)
+
+    if not _has_table('subscription_plans'):
+        op.create_table(
+            'subscription_plans',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(), unique=True),
+            sa.Column('description', sa.String()),
+            sa.Column('price', sa.Float()),
+            sa.Column('features', postgresql.ARRAY(sa.String())),
+            sa.Column('stripe_price_id', sa.String(), unique=True),
+            sa.Column('stripe_product_id', sa.String(), unique=True),
+            sa.Column('billing_interval', sa.String()),
+            sa.Column('is_active', sa.Boolean()),
+        )
+        op.create_index('ix_subscription_plans_id', 'subscription_plans', ['id'])
+        op.create_index('ix_subscription_plans_name', 'subscription_plans', ['name'], unique=True)
+        op.create_index('ix_subscription_plans_stripe_price_id', 'subscription_plans', ['stripe_price_id'], unique=True)
+
+    if not _has_table('customer_subscriptions'):
+        op.create_table(
+            'customer_subscriptions',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.String(), nullable=False),
+            sa.Column('stripe_customer_id', sa.String(), nullable=False, unique=True),
+            sa.Column('stripe_subscription_id', sa.String()),
+            sa.Column('plan_id', sa.Integer(), sa.ForeignKey('subscription_plans.id', ondelete='RESTRICT')),
+            sa.Column('status', postgresql.ENUM(name='subscriptionstatus', create_type=False)),
+            sa.Column('current_period_start', sa.DateTime(timezone=True)),
+            sa.Column('current_period_end', sa.DateTime(timezone=True)),
+            sa.Column('cancel_at_period_end', sa.Boolean()),
+            sa.Column('trial_start', sa.DateTime(timezone=True)),
+            sa.Column('trial_end', sa.DateTime(timezone=True)),
+            sa.Column('scheduled_change_type', postgresql.ENUM(name='scheduledchangetype', create_type=False)),
+            sa.Column('scheduled_change_date', sa.DateTime(timezone=True)),
+            sa.Column('scheduled_plan_id', sa.Integer(), sa.ForeignKey('subscription_plans.id', ondelete='RESTRICT')),
+            sa.Column('last_metadata_sync', sa.DateTime(timezone=True)),
+            sa.Column('last_event_at', sa.DateTime(timezone=True)),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column('updated_at', sa.DateTime(timezone=True)),
+        )
+        op.create_index('ix_customer_subscriptions_user_id', 'customer_subscriptions', ['user_id'])
+        op.create_index('ix_customer_subscriptions_stripe_subscription_id', 'customer_subscriptions', ['stripe_subscription_id'])
+    elif not _has_column('customer_subscriptions', 'last_event_at'):
+        # create_all never adds columns to an existing table
+        op.add_column('customer_subscriptions', sa.Column('last_event_at', sa.DateTime(timezone=True)))
+
+    if not _has_table('stripe_customers'):
+        op.create_table(
+            'stripe_customers',
+            sa.Column('user_id', sa.String(), primary_key=True),
+            sa.Column('stripe_customer_id', sa.String(), nullable=False),
+            sa.Column('email', sa.String()),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index('ix_stripe_customers_stripe_customer_id', 'stripe_customers', ['stripe_customer_id'], unique=True)
+
+    if not _has_table('clerk_metadata_outbox'):
+        op.create_table(
+            'clerk_metadata_outbox',
+            sa.Column('user_id', sa.String(), primary_key=True),
+            sa.Column('metadata_payload', postgresql.JSONB(), nullable=False),
+            sa.Column('fingerprint', sa.String(64), nullable=False),
+            sa.Column('synced_fingerprint', sa.String(64)),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.String()),
+            sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+
+    if not _has_table('stripe_webhook_events'):
+        op.create_table(
+            'stripe_webhook_events',
+            sa.Column('id', sa.String(), primary_key=True),
+            sa.Column('type', sa.String(), nullable=False),
+            sa.Column('payload', postgresql.JSONB(), nullable=False),
+            sa.Column('partition_key', sa.String(), nullable=False),
+            sa.Column('event_created', sa.DateTime(timezone=True), nullable=False),
+            sa.Column('status', postgresql.ENUM(name='webhookeventstatus', create_type=False), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.String()),
+            sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column('processed_at', sa.DateTime(timezone=True)),
+        )
+        op.create_index('ix_stripe_webhook_events_partition_key', 'stripe_webhook_events', ['partition_key'])
+        op.create_index('ix_stripe_webhook_events_status', 'stripe_webhook_events', ['status'])
+
+
+def downgrade() -> None:
+    for table in (
+        'stripe_webhook_events',
+        'clerk_metadata_outbox',
+        'stripe_customers',
+        'customer_subscriptions',
+        'subscription_plans',
+    ):
+        op.drop_table(table)
+    bind = op.get_bind()
+    for enum in (webhook_event_status, scheduled_change_type, subscription_status):
+        enum.drop(bind, checkfirst=True)
@@ -0,0 +1,70 @@
+"""Indexes for the hot customer_subscriptions lookups
+
+- Partial index on user_id for active (non-canceled) subscriptions
+- Unique index on stripe_subscription_id, the upsert conflict target
+- Plain index on stripe_customer_id, whose unique constraint is dropped
+  since a customer can hold several subscriptions over time
+- Index on scheduled_change_date for jobs scanning upcoming changes
+
+Indexes are built CONCURRENTLY so the table stays writable while they build.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_subscriptions_user_active "
+            "ON customer_subscriptions (user_id) WHERE status <> 'CANCELED'"
+        )
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_subscriptions_stripe_subscription_id_unique "
+            "ON customer_subscriptions (stripe_subscription_id)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_customer_subscriptions_stripe_subscription_id")
+        op.execute(
+            "ALTER INDEX ix_customer_subscriptions_stripe_subscription_id_unique "
+            "RENAME TO ix_customer_subscriptions_stripe_subscription_id"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_subscriptions_stripe_customer_id "
+            "ON customer_subscriptions (stripe_customer_id)"
+        )
+        op.execute(
+            "ALTER TABLE customer_subscriptions "
+            "DROP CONSTRAINT IF EXISTS customer_subscriptions_stripe_customer_id_key"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_subscriptions_scheduled_change_date "
+            "ON customer_subscriptions (scheduled_change_date)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_customer_subscriptions_scheduled_change_date")
+        op.execute(
+            "ALTER TABLE customer_subscriptions "
+            "ADD CONSTRAINT customer_subscriptions_stripe_customer_id_key UNIQUE (stripe_customer_id)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_customer_subscriptions_stripe_customer_id")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_subscriptions_stripe_subscription_id_plain "
+            "ON customer_subscriptions (stripe_subscription_id)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_customer_subscriptions_stripe_subscription_id")
+        op.execute(
+            "ALTER INDEX ix_customer_subscriptions_stripe_subscription_id_plain "
+            "RENAME TO ix_customer_subscriptions_stripe_subscription_id"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_customer_subscriptions_user_active")